@@ -20,10 +20,18 @@ _pg_pool: Optional[Any] = None
 _USE_POSTGRES = False
 DB_PATH: Optional[Path] = None
 _DB_BACKEND_NAME: Optional[str] = None  # Track which backend is in use
+_sqlite_available = False  # Set once the SQLite file is known to exist
 
 # Import aiosqlite at module level (will be used if Postgres not available)
 import aiosqlite
 
+try:
+    from blake3 import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+    logger.warning("blake3 not available. PDF hashing will fall back to SHA-256.")
+
 # Canonical field mappings
 CANONICAL_FIELDS = {
     "full_name": ["name", "fullname", "full_name", "fullName", "fullName1", "applicant_name", "name_full"],
@@ -41,6 +49,11 @@ CANONICAL_FIELDS = {
     "ssn": ["ssn", "social_security_number", "socialSecurityNumber", "tax_id"],
 }
 
+# Lowercased aliases, computed once for map_canonical_to_pdf_fields
+_CANONICAL_FIELDS_LOWER = {
+    key: tuple(name.lower() for name in names) for key, names in CANONICAL_FIELDS.items()
+}
+
 
 async def init_db() -> None:
     """Initialize database tables and connection pool.
@@ -311,10 +324,14 @@ def is_db_available() -> bool:
     """Check if database is available (Postgres pool or SQLite file exists).
     Returns True if database backend is ready, False otherwise.
     """
+    global _sqlite_available
     if _USE_POSTGRES:
         return _pg_pool is not None
-    else:
-        return DB_PATH is not None and DB_PATH.exists()
+    # init_db creates the SQLite file and nothing removes it, so once it has been
+    # seen the per-request stat() is skipped
+    if not _sqlite_available:
+        _sqlite_available = DB_PATH is not None and DB_PATH.exists()
+    return _sqlite_available
 
 
 def get_db_backend_name() -> Optional[str]:
@@ -472,6 +489,42 @@ async def create_user(email: str) -> str:
                 raise
 
 
+async def get_or_create_user(email: str) -> str:
+    """Return the user_id for email, creating the user if needed (one round trip for new users)."""
+    user_id = secrets.token_urlsafe(16)
+    now = int(time.time())
+    email_lower = email.lower()
+    
+    if _USE_POSTGRES:
+        async with _pg_pool.acquire() as conn:
+            # DO NOTHING returns no row for an existing email (without writing a
+            # new row version), so only then is the id looked up
+            row = await conn.fetchrow(
+                """INSERT INTO users (id, email, created_at) VALUES ($1, $2, $3)
+                   ON CONFLICT (email) DO NOTHING
+                   RETURNING id""",
+                user_id, email_lower, now
+            )
+            if row:
+                logger.info("Created user: %s", email)
+                return row["id"]
+            row = await conn.fetchrow("SELECT id FROM users WHERE email = $1", email_lower)
+            return row["id"]
+    else:
+        async with aiosqlite.connect(DB_PATH) as db:
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO users (id, email, created_at) VALUES (?, ?, ?)",
+                (user_id, email_lower, now)
+            )
+            if cursor.rowcount == 1:
+                await db.commit()
+                logger.info("Created user: %s", email)
+                return user_id
+            async with db.execute("SELECT id FROM users WHERE email = ?", (email_lower,)) as cursor:
+                row = await cursor.fetchone()
+                return row[0]
+
+
 async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Get user by email."""
     email_lower = email.lower()
@@ -979,6 +1032,37 @@ async def get_latest_magic_token_for_email(email: str) -> Optional[str]:
                 return None
 
 
+async def get_latest_valid_magic_token_for_email(email: str, current_time: int) -> Optional[str]:
+    """Get the most recent unexpired, unused magic token for an email address.
+    
+    Single-query equivalent of get_latest_magic_token_for_email + check_magic_token_valid.
+    Used for debugging purposes only.
+    """
+    email_lower = email.lower()
+    
+    if _USE_POSTGRES:
+        async with _pg_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT token FROM magic_tokens WHERE email = $1 AND expires_at > $2 AND used = 0 "
+                "ORDER BY created_at DESC LIMIT 1",
+                email_lower, current_time
+            )
+            if row:
+                return row["token"]
+            return None
+    else:
+        async with aiosqlite.connect(DB_PATH) as db:
+            async with db.execute(
+                "SELECT token FROM magic_tokens WHERE email = ? AND expires_at > ? AND used = 0 "
+                "ORDER BY created_at DESC LIMIT 1",
+                (email_lower, current_time)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return row[0]
+                return None
+
+
 async def check_magic_token_valid(token: str, current_time: int) -> bool:
     """Check if a magic token is valid (not expired and not used).
     
@@ -1314,19 +1398,41 @@ def map_canonical_to_pdf_fields(canonical_data: Dict[str, Any], pdf_field_names:
     pdf_fields_lower = {f.lower(): f for f in pdf_field_names}
     
     for canonical_key, canonical_value in canonical_data.items():
-        if canonical_key not in CANONICAL_FIELDS:
+        possible_names = _CANONICAL_FIELDS_LOWER.get(canonical_key)
+        if possible_names is None:
             continue
         
         # Try to find matching PDF field
-        for possible_name in CANONICAL_FIELDS[canonical_key]:
-            if possible_name.lower() in pdf_fields_lower:
-                result[pdf_fields_lower[possible_name.lower()]] = canonical_value
+        for possible_name in possible_names:
+            pdf_field = pdf_fields_lower.get(possible_name)
+            if pdf_field is not None:
+                result[pdf_field] = canonical_value
                 break
     
     return result
 
 
-def compute_pdf_hash(pdf_bytes: bytes) -> str:
-    """Compute a hash of PDF content for caching mappings."""
+def new_pdf_hasher() -> Any:
+    """Create an incremental hasher for PDF content (see compute_pdf_hash)."""
+    if BLAKE3_AVAILABLE:
+        return blake3()
     import hashlib
-    return hashlib.sha256(pdf_bytes).hexdigest()[:16]
+    return hashlib.sha256(usedforsecurity=False)
+
+
+def pdf_hasher_hexdigest(hasher: Any) -> str:
+    """Finalize a hasher from new_pdf_hasher() into a 16-char mapping cache key."""
+    if BLAKE3_AVAILABLE:
+        return hasher.hexdigest(length=8)
+    return hasher.hexdigest()[:16]
+
+
+def compute_pdf_hash(pdf_bytes: bytes) -> str:
+    """Compute a hash of PDF content for caching mappings.
+    
+    Uses BLAKE3 (SIMD tree hash) when available; the 16-char key format is
+    unchanged so the pdf_mappings column keeps the same shape.
+    """
+    hasher = new_pdf_hasher()
+    hasher.update(pdf_bytes)
+    return pdf_hasher_hexdigest(hasher)
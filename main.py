@@ -1,39 +1,48 @@
 import asyncio
-import json
+import functools
+import heapq
 import logging
 import hmac
 import os
+import random
 import secrets
-import smtplib
+import threading
 import time
+from datetime import date
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from email.utils import parseaddr
-from concurrent.futures import ThreadPoolExecutor
-from hashlib import sha256
+from hashlib import blake2b, sha256
 from io import BytesIO
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional, Tuple
 
 from fastapi import (
-    BackgroundTasks,
+    APIRouter,
     FastAPI,
     File,
     Form,
     HTTPException,
     Request,
+    Response,
     UploadFile,
     Depends,
     Security,
 )
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, ORJSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import aiosmtplib
+import httpx
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import FormData
+from starlette.exceptions import HTTPException as StarletteHTTPException
+import orjson
 import stripe
 import uvicorn
 from pypdf import PdfReader, PdfWriter
-from pypdf.generic import BooleanObject, NameObject, DictionaryObject
+from pypdf.generic import BooleanObject, NameObject, DictionaryObject, IndirectObject
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
@@ -41,13 +50,14 @@ import db
 import re
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
 
 logging.basicConfig(
-    level=logging.INFO,
+    # LOG_LEVEL=WARNING skips the per-request debug logging on hot endpoints
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
 )
 logger = logging.getLogger("formfillai")
@@ -62,18 +72,31 @@ UPLOAD_DIR = BASE_DIR / "tmp" / "uploads"  # For uploaded PDFs before analysis
 STATIC_DIR = BASE_DIR / "static"
 LOCALES_DIR = STATIC_DIR / "i18n"
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # read uploads in 64KB chunks
+PDF_WRITE_BUFFER_SIZE = 256 * 1024
+# AcroForm /FT values we map to UI widget types
+FIELD_TYPE_BUTTON = NameObject("/Btn")
+FIELD_TYPE_CHOICE = NameObject("/Ch")
 TEMP_TTL_SECONDS = 30 * 60  # 30 minutes
 PREVIEW_TTL_SECONDS = 60 * 60  # 1 hour for previews
 UPLOAD_TTL_SECONDS = 60 * 60  # 1 hour for uploaded PDFs
 CLEAN_INTERVAL_SECONDS = 5 * 60  # clean every 5 minutes
+FULL_SWEEP_INTERVAL_SECONDS = 60 * 60  # directory scan safety net (files from other workers/restarts)
+# Optional nginx offload for previews/downloads: when set (e.g. "/internal/previews",
+# an internal location aliased to PREVIEW_DIR), respond with X-Accel-Redirect and
+# let nginx send the file with sendfile(2) instead of streaming it through Python.
+PREVIEW_ACCEL_REDIRECT_PREFIX = os.getenv("PREVIEW_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
 
 # Supported languages (ordered by popularity after English)
-SUPPORTED_LANGUAGES = [
+SUPPORTED_LANGUAGES = (
     "en", "de", "fr", "it", "es", "pl", "ro", "nl", "cs", "el", 
     "hu", "pt", "sv", "da", "fi", "sk", "bg", "hr", "sl", "lt", 
     "lv", "et", "ga", "mt", "ru", "uk"
-]
+)
+SUPPORTED_LANGUAGES_SET = frozenset(SUPPORTED_LANGUAGES)
 DEFAULT_LANGUAGE = "en"
+# Primary subtag of each Accept-Language entry ("de" in "de-CH;q=0.8")
+_ACCEPT_LANG_RE = re.compile(r"(?:^|,)\s*([a-zA-Z]{2,3})(?=[-_;,\s]|$)")
 
 ENV = os.getenv("ENV", "").lower()
 DEBUG_RAW = os.getenv("DEBUG", "0")
@@ -81,6 +104,9 @@ DEBUG = DEBUG_RAW == "1"
 # Production detection: (ENV == "production") OR (DEBUG is explicitly 0/False AND ENV is set)
 # If ENV is missing/empty, default to dev (not production)
 IS_PRODUCTION = (ENV == "production") or (DEBUG_RAW in ["0", "false", "False"] and bool(ENV))
+DATABASE_URL_SET = bool(os.getenv("DATABASE_URL"))
+# Resolved once init_db has run at startup; the backend never changes afterwards
+DB_BACKEND_NAME = "unknown"
 
 _app_signing_secret_raw = os.getenv("APP_SIGNING_SECRET")
 if not _app_signing_secret_raw:
@@ -97,7 +123,20 @@ if not _app_signing_secret_raw:
         )
 
 APP_SIGNING_SECRET = _app_signing_secret_raw.encode("utf-8")
+# Token MAC: keyed BLAKE2b (128-bit tag, 32 hex chars). The key is derived so a
+# secret of any length fits BLAKE2b's 64-byte key limit; the keyed state is built
+# once and copied per call.
+_TOKEN_MAC_PROTO = blake2b(key=sha256(b"formfillai-token-mac:" + APP_SIGNING_SECRET).digest(), digest_size=16)
+# Legacy HMAC-SHA256 (64 hex chars), still accepted by _verify_token so cookies
+# issued before the switch stay valid until they expire
+_TOKEN_HMAC_PROTO = hmac.new(APP_SIGNING_SECRET, None, sha256)
+# New tokens keep the legacy HMAC tag unless opted in: releases before BLAKE2b
+# cannot verify its tags, so issuing them makes a rollback log everyone out.
+# Turn on once this release (which verifies both) is the oldest you'd roll back to.
+TOKEN_MAC_BLAKE2B = os.getenv("TOKEN_MAC_BLAKE2B", "").lower() in ("1", "true", "yes")
 FREE_DAILY_LIMIT = 1
+# Upper bound on tokens tracked by the in-memory limiter (oldest are evicted)
+USAGE_LIMITER_MAX_TOKENS = 100_000
 
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PRICE_ID = os.getenv("STRIPE_PRICE_ID")
@@ -107,9 +146,12 @@ STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai_client = None
 if OPENAI_AVAILABLE and OPENAI_API_KEY:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    # Async client so LLM round-trips don't block the event loop
+    openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
-# Helper function to normalize environment variables
+# Helper function to normalize environment variables (cached: env is fixed after boot;
+# call get_env.cache_clear() after changing os.environ, e.g. in tests)
+@functools.lru_cache(maxsize=None)
 def get_env(name: str) -> Optional[str]:
     """Get and normalize environment variable.
     
@@ -137,7 +179,12 @@ def get_env(name: str) -> Optional[str]:
     return value
 
 
+# Key for the X-Debug-Key header on /debug/last-magic-link and, in production, /debug/email
+DEBUG_KEY_BYTES = (get_env("DEBUG_KEY") or "").encode()
+
+
 # Extract email from "Name <email>" format if needed
+@functools.lru_cache(maxsize=32)
 def extract_email_from_string(email_str: Optional[str]) -> Optional[str]:
     """Extract email address from string, handling 'Name <email>' format."""
     if not email_str:
@@ -148,13 +195,18 @@ def extract_email_from_string(email_str: Optional[str]) -> Optional[str]:
     return email if email else email_str
 
 
+@functools.lru_cache(maxsize=1)
 def get_email_config() -> Dict[str, Any]:
     """Get unified email configuration (Resend API + SMTP).
     
+    Env-derived and constant for the process lifetime, so it is computed once;
+    callers must treat the returned dict as read-only.
+    
     Returns dict with:
     - resend_configured (RESEND_API_KEY present)
     - smtp_configured (SMTP_HOST/PORT/USER/PASS/FROM present)
     - from_raw (display name), from_email (parsed email)
+    - from_is_angle_format (from_raw looks like "Name <email@domain.com>")
     - resend_api_key, smtp_config (nested)
     """
     # Check Resend API key
@@ -174,12 +226,14 @@ def get_email_config() -> Dict[str, Any]:
         "smtp_configured": smtp_config["configured"],
         "smtp_config": smtp_config,
         "from_raw": from_raw,
-        "from_email": from_email
+        "from_email": from_email,
+        "from_is_angle_format": bool(from_raw and "<" in from_raw and ">" in from_raw)
     }
 
 
+@functools.lru_cache(maxsize=1)
 def get_smtp_config() -> Dict[str, Any]:
-    """Get SMTP configuration with normalized env vars.
+    """Get SMTP configuration with normalized env vars (computed once, read-only).
     
     Returns dict with:
     - host, user, pass, from_raw, from (extracted), port
@@ -251,16 +305,93 @@ SMTP_FROM_RAW = _smtp_config["from_raw"]
 SMTP_FROM = _smtp_config["from"]
 SMTP_PORT = _smtp_config["port"]
 
-# Thread pool for SMTP (smtplib is synchronous)
-_smtp_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="smtp")
+# Pool of logged-in SMTP connections keyed by (host, port, user), so each email
+# skips connect + STARTTLS + AUTH. Entries are (server, last_used, messages_sent).
+SMTP_POOL_MAX_IDLE = 5  # idle connections kept per key
+SMTP_MAX_MESSAGES_PER_CONN = 100
+SMTP_IDLE_TIMEOUT_SECONDS = 100  # close before servers drop idle sessions
+# Per-operation bound: aiosmtplib applies it to the connect and to every command
+# (STARTTLS, AUTH, NOOP, MAIL/RCPT/DATA), so a black-holed server fails fast
+def _smtp_io_timeout() -> float:
+    """SMTP_IO_TIMEOUT in seconds; defaults to 10 if missing or invalid."""
+    timeout_raw = get_env("SMTP_IO_TIMEOUT")
+    if timeout_raw:
+        try:
+            timeout = float(timeout_raw)
+        except ValueError:
+            timeout = None
+        if timeout is not None and 0 < timeout < float("inf"):
+            return timeout
+        logger.warning("SMTP_IO_TIMEOUT could not be parsed as a positive number: %s. Using default 10.", timeout_raw)
+    return 10.0
+
+
+SMTP_IO_TIMEOUT = _smtp_io_timeout()
+# Retry delay: BASE * MULT**(attempt-1), capped, then jittered by +/-50%
+SMTP_BACKOFF_BASE = 1.0
+SMTP_BACKOFF_MULT = 2.0
+SMTP_BACKOFF_CAP = 30.0
+_smtp_pool: Dict[Tuple[str, int, str], list[Tuple[aiosmtplib.SMTP, float, int]]] = {}
+
+# Opt-in hedged magic-link delivery: if Resend hasn't succeeded within the delay,
+# race SMTP against it and take whichever delivers first
+EMAIL_HEDGE = os.getenv("EMAIL_HEDGE", "").lower() in ("1", "true", "yes")
+EMAIL_HEDGE_DELAY_SECONDS = 2.0
+
+# Shared client for the Resend API (keep-alive/TLS reuse across sends);
+# created at startup, closed at shutdown
+_resend_client: Optional[httpx.AsyncClient] = None
 
 # Store last magic link for dev mode debugging
 _last_magic_link: Optional[str] = None
 
-ALLOWED_PDF_TYPES = {"application/pdf"}
-ALLOWED_JSON_TYPES = {"application/json", "text/json"}
+# In-flight magic-link sends keyed by (lowercased email, link base URL); an entry
+# lives only until its send finishes, so concurrent double clicks share one token
+# and one email while a retry after a failure starts a fresh send. The task
+# yields (status_code, body) and every caller builds its own response from it.
+_inflight_magic_links: Dict[Tuple[str, str], "asyncio.Task[Tuple[int, bytes]]"] = {}
+
+SESSION_COOKIE_MAX_AGE = 60 * 60 * 24 * 30  # 30 days
+
+# Opt-in: send the magic-link email after the response (202) so the request does
+# not wait on Resend/SMTP and their retries. Delivery failures are then only
+# logged; by default the send is inline and its outcome is the response.
+MAGIC_LINK_BACKGROUND_SEND = os.getenv("MAGIC_LINK_BACKGROUND_SEND", "").lower() in ("1", "true", "yes")
+# Strong references to background sends (the loop only keeps weak ones)
+_background_email_tasks: set["asyncio.Task[JSONResponse]"] = set()
+
+ALLOWED_PDF_TYPES = frozenset({"application/pdf"})
+ALLOWED_JSON_TYPES = frozenset({"application/json", "text/json"})
+# Lowercase suffixes, as tuples so str.endswith can check them all in one call
+PDF_EXTENSIONS = (".pdf",)
+JSON_EXTENSIONS = (".json",)
+MAGIC_LINK_EMAIL_HTML = (
+    '<html><body><p>Click the link below to sign in to your FormFillAI account:</p>'
+    '<p><a href="{link}">{link}</a></p><p>This link will expire in 15 minutes.</p>'
+    "<p>If you didn't request this link, you can safely ignore this email.</p></body></html>"
+)
+TEST_EMAIL_SUBJECT = "FormFillAI Test Email"
+TEST_EMAIL_HTML = (
+    "<html><body><p>This is a test email from FormFillAI.</p>"
+    "<p>If you received this, SMTP is working correctly.</p></body></html>"
+)
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')  # \Z: $ would accept a trailing newline
+
+# Per-field JSON schemas for /ai-extract structured output (shared, never mutated)
+AI_BOOL_FIELD_SCHEMA = {"type": "boolean", "description": "Value for this field (true/false)"}
+AI_TEXT_FIELD_SCHEMA = {"type": "string", "description": "Value for this field"}
+AI_MODEL = "gpt-4o-mini"
+# Bump when prompts or schemas change so cached responses from the old wording are not reused
+AI_PROMPT_VERSION = "2"
+AI_RESPONSE_CACHE_SIZE = 4096
+# Content-addressed cache of raw model output: identical inputs skip the OpenAI round-trip
+_ai_response_cache: "OrderedDict[bytes, str]" = OrderedDict()
+# Upstream calls in flight per cache key, so concurrent identical requests share one
+_inflight_ai_requests: Dict[bytes, "asyncio.Task[Optional[str]]"] = {}
 
 app = FastAPI(title="FormFillAI", version="0.1.0")
+# Dev-only debug endpoints; included on the app only outside production
+debug_router = APIRouter()
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
 # Mount static files
@@ -268,12 +399,119 @@ if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
+# Upload endpoints and the largest request body they accept (PDF limit plus
+# room for multipart framing and the form fields sent alongside it)
+UPLOAD_PATHS = frozenset({"/fields", "/analyze", "/fill"})
+MAX_UPLOAD_REQUEST_SIZE = MAX_UPLOAD_SIZE + 1024 * 1024
+# Every other request body (auth, profiles, AI field lists, webhooks) is small
+MAX_FORM_REQUEST_SIZE = 1024 * 1024
+BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+
+def file_too_large(max_size: int = MAX_UPLOAD_SIZE) -> HTTPException:
+    """The 413 every upload size check raises, so the message is the same everywhere."""
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_size // (1024 * 1024)}MB.")
+
+
+class RequestSizeLimitMiddleware:
+    """Cap request body size at the ASGI layer.
+    
+    FastAPI parses form and multipart bodies before the endpoint runs, so this
+    has to happen here. A declared Content-Length over the limit is rejected
+    before anything is read; otherwise (including chunked bodies without
+    Content-Length) the bytes actually received are counted, the read fails
+    once they pass the limit, and whatever response the app then starts is
+    replaced with the same 413 (handlers may catch the failed read themselves).
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["method"] not in BODY_METHODS:
+            await self.app(scope, receive, send)
+            return
+        is_upload = scope["path"] in UPLOAD_PATHS
+        limit = MAX_UPLOAD_REQUEST_SIZE if is_upload else MAX_FORM_REQUEST_SIZE
+        too_large = file_too_large() if is_upload else HTTPException(status_code=413, detail="Request body too large.")
+        rejection = JSONResponse(status_code=413, content={"detail": too_large.detail})
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    logger.warning("Rejected request body: path=%s content_length=%s", scope["path"], value.decode())
+                    await rejection(scope, receive, send)
+                    return
+                break
+        
+        received = 0
+        exceeded = False
+        replaced = False
+        
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    if not exceeded:
+                        logger.warning("Rejected request body: path=%s received>%d", scope["path"], limit)
+                    exceeded = True
+                    raise too_large
+            return message
+        
+        async def limited_send(message: Dict[str, Any]) -> None:
+            nonlocal replaced
+            if replaced:
+                return
+            if exceeded and message["type"] == "http.response.start":
+                replaced = True
+                await rejection(scope, receive, send)
+                return
+            await send(message)
+        
+        await self.app(scope, limited_receive, limited_send)
+
+
+app.add_middleware(RequestSizeLimitMiddleware)
+
+
+_tmp_dirs_ready = False
+
+
 def ensure_tmp_dir() -> None:
+    global _tmp_dirs_ready
+    if _tmp_dirs_ready:
+        return
     TMP_DIR.mkdir(parents=True, exist_ok=True)
     PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    _tmp_dirs_ready = True
+
+
+def write_bytes(path: Path, data: bytes) -> None:
+    """Write bytes to path; failures are only logged (callers treat these files as best effort)."""
+    try:
+        with path.open("wb") as fh:
+            fh.write(data)
+    except OSError as exc:
+        logger.warning("Failed to write %s: %s", path, exc)
+
+
+def write_json(path: Path, obj: Any) -> None:
+    """Serialize obj with orjson and write it to path (see write_bytes)."""
+    write_bytes(path, orjson.dumps(obj))
+
+
+def make_json_response(payload: Any, status_code: int = 200) -> Response:
+    """JSON response serialized once with orjson, newline-terminated for polling/curl clients."""
+    return Response(
+        content=orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE),
+        status_code=status_code,
+        media_type="application/json",
+    )
 
 
+@functools.lru_cache(maxsize=256)
 def normalize_language(lang: Optional[str]) -> str:
     """Normalize language code (e.g., 'de-DE' -> 'de')."""
     if not lang:
@@ -281,55 +519,82 @@ def normalize_language(lang: Optional[str]) -> str:
     lang = lang.lower().strip()
     # Extract base language (before hyphen/underscore)
     base_lang = lang.split("-")[0].split("_")[0]
-    return base_lang if base_lang in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+    return base_lang if base_lang in SUPPORTED_LANGUAGES_SET else DEFAULT_LANGUAGE
 
 
 def detect_language(request: Request) -> str:
     """Detect user language from cookie (client-side detection is primary)."""
+    return _resolve_language(request.cookies.get("lang"), request.headers.get("accept-language", ""))
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_language(lang_cookie: Optional[str], accept_lang: str) -> str:
+    """Pure part of detect_language; clients repeat the same few header/cookie pairs."""
     # Check cookie (set by client-side)
-    lang_cookie = request.cookies.get("lang")
     if lang_cookie:
-        normalized = normalize_language(lang_cookie)
-        if normalized in SUPPORTED_LANGUAGES:
-            return normalized
+        return normalize_language(lang_cookie)
     
-    # Fallback to Accept-Language header if no cookie
-    accept_lang = request.headers.get("accept-language", "")
+    # Fallback to Accept-Language header if no cookie: first supported language
     if accept_lang:
-        languages = []
-        for part in accept_lang.split(","):
-            lang_part = part.split(";")[0].strip()
-            languages.append(lang_part)
-        
-        for lang in languages:
-            normalized = normalize_language(lang)
-            if normalized in SUPPORTED_LANGUAGES:
-                return normalized
+        for match in _ACCEPT_LANG_RE.finditer(accept_lang):
+            lang = match.group(1).lower()
+            if lang in SUPPORTED_LANGUAGES_SET:
+                return lang
     
     return DEFAULT_LANGUAGE
 
 
+def _session_debug(request: Request) -> Tuple[list[str], bool, Optional[str]]:
+    """Return (cookie_keys, session_present, session_prefix) for request logging."""
+    session_cookie = request.cookies.get("session")
+    session_prefix = session_cookie[:8] if session_cookie and len(session_cookie) >= 8 else None
+    return list(request.cookies.keys()), bool(session_cookie), session_prefix
+
+
+def _token_signature(raw: str) -> str:
+    h = _TOKEN_MAC_PROTO.copy()
+    h.update(raw.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _legacy_token_signature(raw: str) -> str:
+    h = _TOKEN_HMAC_PROTO.copy()
+    h.update(raw.encode("utf-8"))
+    return h.hexdigest()
+
+
 def _sign_token(raw: str) -> str:
-    sig = hmac.new(APP_SIGNING_SECRET, raw.encode("utf-8"), sha256).hexdigest()
+    sig = _token_signature(raw) if TOKEN_MAC_BLAKE2B else _legacy_token_signature(raw)
     return f"{raw}.{sig}"
 
 
+# Pure in the cookie string (the signing key is fixed per process), and browsers
+# resend the same ffai_token/ffai_pro on every request
+@functools.lru_cache(maxsize=16384)
 def _verify_token(token: Optional[str]) -> Optional[str]:
     if not token or "." not in token:
         return None
     raw, sig = token.rsplit(".", 1)
-    expected = hmac.new(APP_SIGNING_SECRET, raw.encode("utf-8"), sha256).hexdigest()
+    # The tag length tells the schemes apart (32 hex = BLAKE2b, 64 hex = legacy HMAC)
+    expected = _legacy_token_signature(raw) if len(sig) == 64 else _token_signature(raw)
     if not hmac.compare_digest(sig, expected):
         return None
     return raw
 
 
+def _local_day() -> int:
+    """Today's date in the server's local time zone as a day number (the quota resets at local midnight)."""
+    return date.today().toordinal()
+
+
 class UsageLimiter:
-    def __init__(self) -> None:
-        self._counts: Dict[str, Tuple[str, int]] = {}
+    def __init__(self, max_tokens: int = USAGE_LIMITER_MAX_TOKENS) -> None:
+        # token -> (local day number, count), least recently used first
+        self._counts: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        self._max_tokens = max_tokens
 
     def check_and_increment(self, token: str, limit: int = FREE_DAILY_LIMIT) -> None:
-        today = time.strftime("%Y-%m-%d")
+        today = _local_day()
         day, count = self._counts.get(token, (today, 0))
         if day != today:
             day, count = today, 0
@@ -339,6 +604,17 @@ class UsageLimiter:
                 detail="Daily free limit reached. Upgrade to continue filling forms today.",
             )
         self._counts[token] = (day, count + 1)
+        self._counts.move_to_end(token)
+        while len(self._counts) > self._max_tokens:
+            self._counts.popitem(last=False)
+
+    def sweep(self) -> int:
+        """Drop tokens whose count is from a previous day; returns how many were removed."""
+        today = _local_day()
+        stale = [token for token, (day, _) in self._counts.items() if day != today]
+        for token in stale:
+            del self._counts[token]
+        return len(stale)
 
 
 usage_limiter = UsageLimiter()
@@ -352,7 +628,7 @@ def create_entitlement_token(expiry_ts: int, sub_id: str, customer_id: Optional[
         "customer_id": customer_id,
         "nonce": secrets.token_urlsafe(8),
     }
-    raw = json.dumps(payload, separators=(",", ":"), sort_keys=True)
+    raw = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS).decode("utf-8")
     return _sign_token(raw)
 
 
@@ -362,8 +638,8 @@ def parse_entitlement_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
     if not raw:
         return None
     try:
-        data = json.loads(raw)
-    except json.JSONDecodeError:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
         return None
     if not isinstance(data, dict):
         return None
@@ -373,21 +649,39 @@ def parse_entitlement_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
 class SubscriptionDenylist:
     """In-memory cache for recently inactive subscriptions."""
 
-    def __init__(self) -> None:
-        self._entries: Dict[str, float] = {}
+    def __init__(self, ttl_seconds: int = 24 * 60 * 60) -> None:
+        # sub_id -> marked-at time, oldest first (re-marking moves an entry to the end)
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._ttl_seconds = ttl_seconds
 
     def mark_inactive(self, sub_id: str) -> None:
-        self._entries[sub_id] = time.time()
+        now = time.time()
+        self._entries[sub_id] = now
+        self._entries.move_to_end(sub_id)
+        self.sweep(now)
 
-    def is_inactive(self, sub_id: str, ttl_seconds: int = 24 * 60 * 60) -> bool:
+    def is_inactive(self, sub_id: str) -> bool:
         ts = self._entries.get(sub_id)
         if ts is None:
             return False
-        if time.time() - ts > ttl_seconds:
+        if time.time() - ts > self._ttl_seconds:
             self._entries.pop(sub_id, None)
             return False
         return True
 
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop expired entries from the old end; returns how many were removed."""
+        if now is None:
+            now = time.time()
+        removed = 0
+        while self._entries:
+            sub_id, ts = next(iter(self._entries.items()))
+            if now - ts <= self._ttl_seconds:
+                break
+            del self._entries[sub_id]
+            removed += 1
+        return removed
+
 
 subscription_denylist = SubscriptionDenylist()
 
@@ -417,27 +711,61 @@ def get_pro_entitlement_any(cookie_value: Optional[str]) -> Optional[Dict[str, A
     return data
 
 
-def validate_file_type(upload_file: UploadFile, allowed_types: Iterable[str], extensions: Iterable[str]) -> None:
+def validate_file_type(upload_file: UploadFile, allowed_types: frozenset[str], extensions: Tuple[str, ...]) -> None:
     content_type_ok = upload_file.content_type in allowed_types
-    extension_ok = any(upload_file.filename.lower().endswith(ext) for ext in extensions if upload_file.filename)
+    extension_ok = (upload_file.filename or "").lower().endswith(extensions)
     if not (content_type_ok or extension_ok):
         raise HTTPException(status_code=400, detail=f"Invalid file type for {upload_file.filename}.")
 
 
+def parse_json_form(raw: str, expected: type, detail: str) -> Any:
+    # Bad JSON and a wrong top-level type both surface as the same 400
+    try:
+        value = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail=detail)
+    if not isinstance(value, expected):
+        raise HTTPException(status_code=400, detail=detail)
+    return value
+
+
 async def read_upload_file(upload_file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> bytes:
-    content = await upload_file.read()
-    if len(content) > max_size:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File {upload_file.filename} exceeds max size of {max_size // (1024 * 1024)}MB.",
-        )
-    return content
+    # Chunked so an oversized upload is rejected without buffering all of it
+    chunks: list[bytes] = []
+    size = 0
+    while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise file_too_large(max_size)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_pdf_upload(upload_file: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> Tuple[bytes, str]:
+    """Read a PDF upload in chunks, hashing as it arrives.
+    
+    Returns (pdf_bytes, pdf_hash). Raises 413 as soon as the upload passes
+    max_size instead of buffering the whole file first.
+    """
+    hasher = db.new_pdf_hasher()
+    chunks: list[bytes] = []
+    size = 0
+    while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_size:
+            raise file_too_large(max_size)
+        hasher.update(chunk)
+        chunks.append(chunk)
+    # One contiguous bytes object: BytesIO(pdf_bytes) then shares this buffer
+    # instead of copying it for each PdfReader
+    return b"".join(chunks), db.pdf_hasher_hexdigest(hasher)
 
 
 def parse_json_payload(payload: bytes) -> Dict[str, Any]:
     try:
-        data = json.loads(payload.decode("utf-8"))
-    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        # orjson validates UTF-8 itself and reports bad bytes as a decode error
+        data = orjson.loads(payload)
+    except orjson.JSONDecodeError as exc:
         logger.warning("Failed to parse JSON payload: %s", exc)
         raise HTTPException(status_code=400, detail="Invalid JSON file.")
     if not isinstance(data, dict):
@@ -455,121 +783,86 @@ def ensure_form_fields(reader: PdfReader) -> Dict[str, Any]:
     return fields
 
 
+def _resolve(obj: Any) -> Any:
+    """Dereference an indirect PDF object; dict.get on pypdf dictionaries does not."""
+    return obj.get_object() if type(obj) is IndirectObject else obj
+
+
+def _field_label(field_obj: Any, field_name: str) -> Optional[str]:
+    """Label priority: tooltip /TU > descriptive /T > widget /Contents."""
+    # Try /TU (tooltip/alternate name) first
+    tu = _resolve(field_obj.get("/TU"))
+    if isinstance(tu, str) and tu.strip():
+        return tu.strip()
+
+    # /T (field title) only counts when it is more descriptive than the name
+    t = _resolve(field_obj.get("/T"))
+    if isinstance(t, str) and t.strip() and t.strip() != field_name:
+        return t.strip()
+
+    get_widgets = getattr(field_obj, "get_widgets", None)
+    if get_widgets is not None:
+        for widget in get_widgets() or ():
+            contents = _resolve(widget.get("/Contents"))
+            if isinstance(contents, str) and contents.strip():
+                return contents.strip()
+    return None
+
+
 def extract_field_metadata(reader: PdfReader) -> list[Dict[str, Any]]:
     """Extract form field metadata for UI rendering."""
     fields = ensure_form_fields(reader)
     result = []
     
     for field_name, field_obj in fields.items():
-        field_info: Dict[str, Any] = {"name": field_name, "value": ""}
-        
-        # Extract label from PDF metadata (priority: tooltip/TU > widget annotation > name)
-        label = None
+        field_info: Dict[str, Any] = {"name": field_name, "value": "", "label": field_name, "type": "text"}
+        if not isinstance(field_obj, dict):
+            result.append(field_info)
+            continue
+
+        # Each step fails independently: a bad label must not cost the value or type
         try:
-            if hasattr(field_obj, "get"):
-                # Try /TU (tooltip/alternate name) first
-                tu = field_obj.get("/TU")
-                if tu is not None:
-                    if hasattr(tu, "get_object"):
-                        tu = tu.get_object()
-                    if isinstance(tu, str) and tu.strip():
-                        label = tu.strip()
-                
-                # If no /TU, try /T (field title/name) which might be more descriptive
-                if not label:
-                    t = field_obj.get("/T")
-                    if t is not None:
-                        if hasattr(t, "get_object"):
-                            t = t.get_object()
-                        if isinstance(t, str) and t.strip():
-                            # Only use /T if it's different from the field name (more descriptive)
-                            if t.strip() != field_name:
-                                label = t.strip()
-                
-                # If still no label, try to get from widget annotations
-                if not label:
-                    # Try to find widget annotation with /Contents (label text)
-                    if hasattr(field_obj, "get_widgets"):
-                        widgets = field_obj.get_widgets()
-                        if widgets:
-                            for widget in widgets:
-                                if hasattr(widget, "get"):
-                                    contents = widget.get("/Contents")
-                                    if contents is not None:
-                                        if hasattr(contents, "get_object"):
-                                            contents = contents.get_object()
-                                        if isinstance(contents, str) and contents.strip():
-                                            label = contents.strip()
-                                            break
+            field_info["label"] = _field_label(field_obj, field_name) or field_name
         except Exception:
-            pass  # Continue without label
-        
-        # Set label: use extracted label or fallback to field name
-        field_info["label"] = label if label else field_name
-        
+            pass  # Keep the field name as label
+
         # Get existing value if any
         try:
-            if hasattr(field_obj, "get"):
-                val = field_obj.get("/V")
-                if val is not None:
-                    if hasattr(val, "get_object"):
-                        val = val.get_object()
-                    if isinstance(val, bool):
-                        field_info["value"] = val
-                    elif isinstance(val, (str, int, float)):
-                        field_info["value"] = str(val)
-                    elif isinstance(val, list) and len(val) > 0:
-                        first = val[0]
-                        if hasattr(first, "get_object"):
-                            first = first.get_object()
-                        field_info["value"] = str(first)
+            val = _resolve(field_obj.get("/V"))
+            if isinstance(val, bool):
+                field_info["value"] = val
+            elif isinstance(val, (str, int, float)):
+                field_info["value"] = str(val)
+            elif isinstance(val, list) and val:
+                field_info["value"] = str(_resolve(val[0]))
         except Exception:
             pass  # Use default empty value
-        
+
         # Infer field type from /FT (field type)
         try:
-            ft = field_obj.get("/FT") if hasattr(field_obj, "get") else None
-            if ft:
-                if hasattr(ft, "get_object"):
-                    ft = ft.get_object()
-                ft_str = str(ft) if ft else ""
-                if "/Btn" in ft_str or "Btn" in ft_str:
-                    # Check if it's a checkbox or radio
-                    ff = field_obj.get("/Ff") if hasattr(field_obj, "get") else None
-                    if ff is not None:
-                        if hasattr(ff, "get_object"):
-                            ff = ff.get_object()
-                        if isinstance(ff, int) and (ff & 0x8000):  # Radio button flag
-                            field_info["type"] = "choice"
-                            field_info["options"] = []
-                        else:
-                            field_info["type"] = "checkbox"
-                    else:
-                        field_info["type"] = "checkbox"
-                elif "/Ch" in ft_str or "Ch" in ft_str:
+            ft = _resolve(field_obj.get("/FT"))
+            if ft == FIELD_TYPE_BUTTON:
+                ff = _resolve(field_obj.get("/Ff"))
+                if isinstance(ff, int) and (ff & 0x8000):  # Radio button flag
                     field_info["type"] = "choice"
-                    # Try to extract options
-                    opt = field_obj.get("/Opt") if hasattr(field_obj, "get") else None
-                    if opt is not None:
-                        if hasattr(opt, "get_object"):
-                            opt = opt.get_object()
-                        if isinstance(opt, list):
-                            options = []
-                            for item in opt:
-                                if hasattr(item, "get_object"):
-                                    item = item.get_object()
-                                if isinstance(item, (str, int, float)):
-                                    options.append(str(item))
-                                elif isinstance(item, list) and len(item) > 0:
-                                    options.append(str(item[0]))
-                            if options:
-                                field_info["options"] = options
+                    field_info["options"] = []
                 else:
-                    field_info["type"] = "text"
-            else:
-                field_info["type"] = "text"
+                    field_info["type"] = "checkbox"
+            elif ft == FIELD_TYPE_CHOICE:
+                field_info["type"] = "choice"
+                opt = _resolve(field_obj.get("/Opt"))
+                if isinstance(opt, list):
+                    options = []
+                    for item in opt:
+                        item = _resolve(item)
+                        if isinstance(item, (str, int, float)):
+                            options.append(str(item))
+                        elif isinstance(item, list) and item:
+                            options.append(str(item[0]))
+                    if options:
+                        field_info["options"] = options
         except Exception:
-            field_info["type"] = "text"  # Default to text on error
+            pass  # Type defaults to text
         
         result.append(field_info)
     
@@ -591,26 +884,14 @@ def copy_acroform_and_set_appearances(writer: PdfWriter, reader: PdfReader) -> N
         if not acro_form_ref:
             raise ValueError("No /AcroForm found in PDF")
         
-        # Get the actual AcroForm dictionary object
-        if hasattr(acro_form_ref, "get_object"):
-            acro_form_obj = acro_form_ref.get_object()
-        else:
-            acro_form_obj = acro_form_ref
-        
-        # Create a new dictionary object for the writer by copying fields manually
-        new_acro_form = DictionaryObject()
+        acro_form_obj = _resolve(acro_form_ref)
+        if not isinstance(acro_form_obj, dict):
+            raise ValueError("/AcroForm is not a dictionary")
         
-        # Copy all fields from the original AcroForm
-        if isinstance(acro_form_obj, dict):
-            for key, value in acro_form_obj.items():
-                if key != "/NeedAppearances":  # We'll set this explicitly
-                    new_acro_form[NameObject(key)] = value
-        elif hasattr(acro_form_obj, "keys"):
-            for key in acro_form_obj.keys():
-                if key != "/NeedAppearances":
-                    new_acro_form[NameObject(key)] = acro_form_obj[key]
-        
-        # Set /NeedAppearances = true
+        # Deep copy into the writer: the reader may be filled again later, so its
+        # objects must not end up shared with (or changed through) this output.
+        # Fields already cloned with the pages map to those same clones.
+        new_acro_form = acro_form_obj.clone(writer)
         new_acro_form[NameObject("/NeedAppearances")] = BooleanObject(True)
         
         # Add to writer's root using update method
@@ -631,32 +912,151 @@ def copy_acroform_and_set_appearances(writer: PdfWriter, reader: PdfReader) -> N
         )
 
 
+@functools.lru_cache(maxsize=8)
+def _watermark_overlay_pdf(page_width: float, page_height: float, text: str) -> bytes:
+    """Single-page ReportLab overlay for one page size (shared across requests)."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
+    c.setFillColorRGB(0.35, 0.4, 0.45)
+    c.setFont("Helvetica", 8)
+    margin_x = 15 * mm
+    margin_y = 10 * mm
+    c.drawString(margin_x, margin_y, text)
+    c.save()
+    return buffer.getvalue()
+
+
 def add_free_watermark(writer: PdfWriter, text: str = "Filled with FormFillAI (Free)") -> None:
     """Add a small footer watermark text by overlaying a PDF onto each page."""
-    for i, page in enumerate(writer.pages):
+    # One overlay per distinct page size; the parsed page is private to this call
+    # since a PdfReader is not safe to share between concurrent fills
+    overlays: Dict[Tuple[float, float], Any] = {}
+    for page in writer.pages:
         media_box = page.mediabox
-        page_width = float(media_box.width)
-        page_height = float(media_box.height)
-
-        # Create a single-page PDF overlay in memory with ReportLab.
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=(page_width, page_height))
-        c.setFillColorRGB(0.35, 0.4, 0.45)
-        c.setFont("Helvetica", 8)
-        margin_x = 15 * mm
-        margin_y = 10 * mm
-        c.drawString(margin_x, margin_y, text)
-        c.save()
-        buffer.seek(0)
-
-        overlay_reader = PdfReader(buffer)
-        overlay_page = overlay_reader.pages[0]
+        size = (round(float(media_box.width), 2), round(float(media_box.height), 2))
+        overlay_page = overlays.get(size)
+        if overlay_page is None:
+            overlay_page = PdfReader(BytesIO(_watermark_overlay_pdf(size[0], size[1], text))).pages[0]
+            overlays[size] = overlay_page
         page.merge_page(overlay_page)
 
 
-def fill_pdf_form(pdf_bytes: bytes, data: Dict[str, Any], add_watermark: bool, output_path: Optional[Path] = None) -> Path:
-    """Fill PDF form with data. If output_path is provided, save there; otherwise create temp file."""
-    reader = PdfReader(BytesIO(pdf_bytes))
+# The one cache of parsed PDFs: originals by file_id (LRU) so /ai-fix rounds
+# skip re-parsing. Readers are never shared between uploads. Each entry carries
+# a lock: a PdfReader reads from one shared stream and fills run in the thread pool.
+PARSED_PDF_CACHE_SIZE = 64
+_parsed_pdf_cache: "OrderedDict[str, Tuple[PdfReader, threading.Lock]]" = OrderedDict()
+
+
+async def parse_pdf(pdf_bytes: bytes) -> PdfReader:
+    """Parse PDF bytes off the event loop."""
+    return await run_in_threadpool(PdfReader, BytesIO(pdf_bytes))
+
+
+def run_locked(lock: threading.Lock, func, *args, **kwargs):
+    """Call func while holding lock (for use with run_in_threadpool)."""
+    with lock:
+        return func(*args, **kwargs)
+
+
+def cache_parsed_pdf(file_id: str, reader: PdfReader) -> Tuple[PdfReader, threading.Lock]:
+    """Cache reader for file_id with a fresh lock; returns the (reader, lock) entry."""
+    entry = (reader, threading.Lock())
+    _parsed_pdf_cache[file_id] = entry
+    _parsed_pdf_cache.move_to_end(file_id)
+    while len(_parsed_pdf_cache) > PARSED_PDF_CACHE_SIZE:
+        _parsed_pdf_cache.popitem(last=False)
+    return entry
+
+
+def get_cached_parsed_pdf(file_id: str) -> Optional[Tuple[PdfReader, threading.Lock]]:
+    entry = _parsed_pdf_cache.get(file_id)
+    if entry is not None:
+        _parsed_pdf_cache.move_to_end(file_id)
+    return entry
+
+
+def forget_parsed_pdf(original_name: str) -> None:
+    """Drop the cached parse for a deleted {file_id}_original.pdf (other names are ignored)."""
+    if original_name.endswith("_original.pdf"):
+        _parsed_pdf_cache.pop(original_name[:-len("_original.pdf")], None)
+
+
+# Preview metadata written by /fill, kept in memory so /ai-fix rounds skip the
+# _meta.json read; the file stays the fallback after a restart or eviction
+PREVIEW_META_CACHE_SIZE = 10_000
+_preview_meta_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+
+def remember_preview_meta(file_id: str, meta: Dict[str, Any]) -> None:
+    _preview_meta_cache[file_id] = meta
+    while len(_preview_meta_cache) > PREVIEW_META_CACHE_SIZE:
+        _preview_meta_cache.popitem(last=False)
+
+
+def load_preview_meta(file_id: str, metadata_path: Path) -> Dict[str, Any]:
+    """Metadata for a preview: in-memory copy, else the _meta.json file, else {}."""
+    meta = _preview_meta_cache.get(file_id)
+    if meta is not None:
+        _preview_meta_cache.move_to_end(file_id)
+        return meta
+    try:
+        with metadata_path.open("rb") as fh:
+            meta = orjson.loads(fh.read())
+    except Exception:
+        return {}
+    return meta if isinstance(meta, dict) else {}
+
+
+def _qualified_field_name(field: DictionaryObject) -> str:
+    """Dotted field name as pypdf matches it (/TM wins, else parent /T chain)."""
+    parts = []
+    seen = set()
+    while field is not None and id(field) not in seen:
+        seen.add(id(field))
+        if "/TM" in field:
+            parts.append(str(field["/TM"]))
+            break
+        parts.append(str(field.get("/T", "")))
+        field = _resolve(field.get("/Parent"))
+    return ".".join(reversed(parts))
+
+
+def page_field_names(reader: PdfReader) -> list[frozenset[str]]:
+    """For each page, the names update_page_form_field_values can match there."""
+    result = []
+    for page in reader.pages:
+        names = set()
+        for annot in _resolve(page.get("/Annots")) or ():
+            annot = _resolve(annot)
+            if annot.get("/Subtype") != "/Widget":
+                continue
+            if "/FT" in annot and "/T" in annot:
+                parent = annot
+            else:
+                parent = _resolve(annot.get("/Parent"))
+                if parent is None:
+                    continue
+            names.add(_qualified_field_name(parent))
+            if "/T" in parent:
+                names.add(str(parent["/T"]))
+        result.append(frozenset(names))
+    return result
+
+
+def fill_pdf_form(
+    pdf_bytes: Optional[bytes],
+    data: Dict[str, Any],
+    add_watermark: bool,
+    output_path: Optional[Path] = None,
+    reader: Optional[PdfReader] = None,
+) -> Path:
+    """Fill PDF form with data. If output_path is provided, save there; otherwise create temp file.
+    
+    Pass an already parsed reader to skip re-parsing pdf_bytes.
+    """
+    if reader is None:
+        reader = PdfReader(BytesIO(pdf_bytes))
     fields = ensure_form_fields(reader)
     field_names = set(fields.keys())
     # Convert values to appropriate types: keep bools as bool, convert others to str
@@ -675,9 +1075,11 @@ def fill_pdf_form(pdf_bytes: bytes, data: Dict[str, Any], add_watermark: bool, o
     # Copy /AcroForm from reader to writer BEFORE updating fields
     copy_acroform_and_set_appearances(writer, reader)
     
-    # Update form field values
-    for page in writer.pages:
-        writer.update_page_form_field_values(page, filtered_data)
+    # Update form field values, handing each page only the fields it has widgets for
+    for page, names in zip(writer.pages, page_field_names(reader)):
+        page_data = {k: v for k, v in filtered_data.items() if k in names}
+        if page_data:
+            writer.update_page_form_field_values(page, page_data)
 
     if add_watermark:
         add_free_watermark(writer)
@@ -687,43 +1089,95 @@ def fill_pdf_form(pdf_bytes: bytes, data: Dict[str, Any], add_watermark: bool, o
         tmp_file = output_path
     else:
         tmp_file = TMP_DIR / f"filled_{int(time.time() * 1000)}.pdf"
-    with tmp_file.open("wb") as fh:
-        writer.write(fh)
+    # pypdf streams the output in many small writes, so buffer generously, and
+    # publish with an atomic rename: /preview may be serving the previous
+    # version of this file while /ai-fix regenerates it
+    partial = tmp_file.with_name(f"{tmp_file.name}.{secrets.token_hex(4)}.part")
+    try:
+        with partial.open("wb", buffering=PDF_WRITE_BUFFER_SIZE) as fh:
+            writer.write(fh)
+        os.replace(partial, tmp_file)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
     return tmp_file
 
 
-def cleanup_tmp_directory(ttl_seconds: int = TEMP_TTL_SECONDS) -> None:
-    now = time.time()
-    for path in TMP_DIR.glob("*"):
+def _remove_expired_files(directory: Path, ttl_seconds: int, now: float, label: str) -> list[str]:
+    """Delete regular files in directory older than ttl_seconds; returns removed names.
+    
+    Uses os.scandir so each entry costs one stat (cached on the DirEntry).
+    """
+    removed = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and now - entry.stat().st_mtime > ttl_seconds:
+                        os.unlink(entry.path)
+                        removed.append(entry.name)
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    logger.warning("Failed to cleanup %s %s: %s", label, entry.path, exc)
+    except FileNotFoundError:
+        pass
+    return removed
+
+
+# (deadline, path, ttl) for files this worker wrote; lets each cleanup tick touch
+# only what is due instead of scanning every directory
+_expiry_heap: list[Tuple[float, str, int]] = []
+
+
+def schedule_expiry(path: Path, ttl_seconds: int) -> None:
+    heapq.heappush(_expiry_heap, (time.time() + ttl_seconds, str(path), ttl_seconds))
+
+
+def remove_due_files(now: Optional[float] = None) -> None:
+    """Delete scheduled files whose deadline has passed (re-checking mtime, since
+    /ai-fix rewrites previews in place)."""
+    if now is None:
+        now = time.time()
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        _, path, ttl_seconds = heapq.heappop(_expiry_heap)
         try:
-            if path.is_file() and now - path.stat().st_mtime > ttl_seconds:
-                path.unlink(missing_ok=True)
+            mtime = os.stat(path).st_mtime
+            if now - mtime <= ttl_seconds:
+                heapq.heappush(_expiry_heap, (mtime + ttl_seconds, path, ttl_seconds))
+                continue
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
         except OSError as exc:
             logger.warning("Failed to cleanup %s: %s", path, exc)
+            continue
+        forget_parsed_pdf(os.path.basename(path))
+
+
+def cleanup_tmp_directory(ttl_seconds: int = TEMP_TTL_SECONDS) -> None:
+    now = time.time()
+    _remove_expired_files(TMP_DIR, ttl_seconds, now, "tmp")
     
     # Cleanup preview directory (including original PDFs and metadata)
-    if PREVIEW_DIR.exists():
-        for path in PREVIEW_DIR.glob("*"):
-            try:
-                if path.is_file() and now - path.stat().st_mtime > PREVIEW_TTL_SECONDS:
-                    path.unlink(missing_ok=True)
-            except OSError as exc:
-                logger.warning("Failed to cleanup preview %s: %s", path, exc)
+    for name in _remove_expired_files(PREVIEW_DIR, PREVIEW_TTL_SECONDS, now, "preview"):
+        forget_parsed_pdf(name)
     
     # Cleanup upload directory
-    if UPLOAD_DIR.exists():
-        for path in UPLOAD_DIR.glob("*"):
-            try:
-                if path.is_file() and now - path.stat().st_mtime > UPLOAD_TTL_SECONDS:
-                    path.unlink(missing_ok=True)
-            except OSError as exc:
-                logger.warning("Failed to cleanup upload %s: %s", path, exc)
+    _remove_expired_files(UPLOAD_DIR, UPLOAD_TTL_SECONDS, now, "upload")
 
 
 async def periodic_cleanup() -> None:
     ensure_tmp_dir()
+    last_full_sweep = 0.0
     while True:
-        cleanup_tmp_directory()
+        now = time.time()
+        if now - last_full_sweep >= FULL_SWEEP_INTERVAL_SECONDS:
+            cleanup_tmp_directory()
+            last_full_sweep = now
+        remove_due_files(now)
+        usage_limiter.sweep()
+        subscription_denylist.sweep(now)
         await asyncio.sleep(CLEAN_INTERVAL_SECONDS)
 
 
@@ -742,7 +1196,7 @@ async def startup_event() -> None:
     logger.info("App version: commit=%s", commit_hash)
     
     # Log environment and required variables BEFORE any initialization
-    database_url_set = bool(os.getenv("DATABASE_URL"))
+    database_url_set = DATABASE_URL_SET
     app_signing_secret_set = bool(os.getenv("APP_SIGNING_SECRET"))
     
     logger.info("Startup config: ENV=%s DEBUG=%s DATABASE_URL=%s APP_SIGNING_SECRET=%s",
@@ -752,8 +1206,10 @@ async def startup_event() -> None:
     await db.init_db()
     
     # Log database backend (after init_db which sets it)
+    global DB_BACKEND_NAME
     db_backend = db.get_db_backend_name()
-    database_url_set = bool(os.getenv("DATABASE_URL"))
+    DB_BACKEND_NAME = db_backend or "unknown"
+    database_url_set = DATABASE_URL_SET
     if db_backend:
         logger.info("DB backend consistency: backend=%s DATABASE_URL=%s ENV=%s DEBUG=%s IS_PRODUCTION=%s",
                     db_backend, database_url_set, ENV or "not set", DEBUG, IS_PRODUCTION)
@@ -774,20 +1230,31 @@ async def startup_event() -> None:
                 resend_api_key_present, smtp_configured, public_base_url_present, db_backend)
     
     asyncio.create_task(periodic_cleanup())
+    asyncio.create_task(periodic_smtp_eviction())
     if STRIPE_SECRET_KEY:
         stripe.api_key = STRIPE_SECRET_KEY
         logger.info("Stripe API key configured.")
     else:
         logger.info("Stripe not configured; upgrade-to-pro will be disabled.")
     
+    get_resend_client()
+    
     logger.info("FormFillAI startup complete; temp dir: %s", TMP_DIR)
 
 
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    global _resend_client
+    if _resend_client is not None:
+        await _resend_client.aclose()
+        _resend_client = None
+
+
 async def get_current_user_async(request: Request) -> Optional[Dict[str, Any]]:
     """Get current user from session cookie (async)."""
     session_id = request.cookies.get("session")
-    db_backend = db.get_db_backend_name()
-    database_url_set = bool(os.getenv("DATABASE_URL"))
+    db_backend = DB_BACKEND_NAME
+    database_url_set = DATABASE_URL_SET
     
     if not session_id:
         logger.debug("get_current_user_async: no session cookie, backend=%s DATABASE_URL=%s", 
@@ -821,18 +1288,49 @@ async def require_user(
     return user
 
 
-def require_pro(user: Dict[str, Any] = Depends(require_user), request: Request = None) -> Dict[str, Any]:
+def get_is_pro(request: Request) -> bool:
+    """FastAPI dependency: whether the ffai_pro cookie carries an active entitlement."""
+    return get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
+
+
+def require_pro(
+    user: Dict[str, Any] = Depends(require_user),
+    is_pro: bool = Depends(get_is_pro),
+) -> Dict[str, Any]:
     """Require Pro subscription."""
-    if request:
-        is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
-        if not is_pro and not user.get("is_pro"):
-            raise HTTPException(status_code=403, detail="Pro subscription required.")
+    if not is_pro and not user.get("is_pro"):
+        raise HTTPException(status_code=403, detail="Pro subscription required.")
     return user
 
 
+def get_browser_token(request: Request) -> Tuple[str, Optional[str]]:
+    """FastAPI dependency: (token_raw, new_token_raw) from the signed ffai_token cookie.
+    
+    new_token_raw is set when the cookie was missing or invalid; pass it to
+    set_browser_token_cookie on the response.
+    """
+    token_raw = _verify_token(request.cookies.get("ffai_token"))
+    if token_raw is not None:
+        return token_raw, None
+    new_token_raw = secrets.token_urlsafe(16)
+    return new_token_raw, new_token_raw
+
+
+def set_browser_token_cookie(response: Response, new_token_raw: Optional[str]) -> None:
+    """Issue the ffai_token cookie for a token created by get_browser_token."""
+    if new_token_raw:
+        response.set_cookie(
+            key="ffai_token",
+            value=_sign_token(new_token_raw),
+            httponly=True,
+            secure=False,
+            samesite="lax",
+            max_age=60 * 60 * 24 * 30,
+        )
+
+
 @app.get("/", response_class=HTMLResponse)
-async def index(request: Request) -> HTMLResponse:
-    is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
+async def index(request: Request, is_pro: bool = Depends(get_is_pro)) -> HTMLResponse:
     lang = detect_language(request)  # Fallback detection, client-side is primary
     user = await get_current_user_async(request)
     return templates.TemplateResponse(
@@ -847,8 +1345,7 @@ async def index(request: Request) -> HTMLResponse:
 
 
 @app.get("/pricing", response_class=HTMLResponse)
-async def pricing(request: Request) -> HTMLResponse:
-    is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
+async def pricing(request: Request, is_pro: bool = Depends(get_is_pro)) -> HTMLResponse:
     lang = detect_language(request)
     user = await get_current_user_async(request)
     return templates.TemplateResponse(
@@ -866,7 +1363,7 @@ async def pricing(request: Request) -> HTMLResponse:
 async def set_language(request: Request, lang: str = Form(...)) -> JSONResponse:
     """Set language preference in cookie."""
     normalized = normalize_language(lang)
-    if normalized not in SUPPORTED_LANGUAGES:
+    if normalized not in SUPPORTED_LANGUAGES_SET:
         normalized = DEFAULT_LANGUAGE
     
     response = JSONResponse({"success": True, "lang": normalized})
@@ -894,14 +1391,8 @@ async def extract_fields_get() -> JSONResponse:
 async def extract_fields(
     request: Request,
     pdf_file: UploadFile = File(...)
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Extract form fields from a fillable PDF. Supports both authenticated and anonymous users."""
-    # Log cookie presence for debugging
-    cookie_keys = list(request.cookies.keys())
-    session_cookie = request.cookies.get("session")
-    session_present = bool(session_cookie)
-    session_prefix = session_cookie[:8] if session_cookie and len(session_cookie) >= 8 else None
-    
     # Check authentication (optional)
     user = await get_current_user_async(request)
     is_authenticated = user is not None
@@ -936,48 +1427,27 @@ async def extract_fields(
     filename = pdf_file.filename or "unknown"
     content_type = pdf_file.content_type or "unknown"
     
-    logger.info("POST /fields: cookie_keys=%s session_present=%s session_prefix=%s",
-                cookie_keys, session_present, session_prefix)
-    
-    # Get file size if possible (before reading)
-    file_size = 0
-    try:
-        if hasattr(pdf_file, 'size'):
-            file_size = pdf_file.size
-        elif hasattr(pdf_file, 'file'):
-            pdf_file.file.seek(0, 2)  # Seek to end
-            file_size = pdf_file.file.tell()
-            pdf_file.file.seek(0)  # Reset
-    except:
-        pass
-    
-    logger.info("POST /fields HIT: filename=%s content_type=%s size=%d authenticated=%s user_id=%s user_email=%s cookie_keys=%s session_present=%s",
-                filename, content_type, file_size, is_authenticated, user_id, user_email, cookie_keys, session_present)
-    
     try:
-        validate_file_type(pdf_file, ALLOWED_PDF_TYPES, extensions=(".pdf",))
+        validate_file_type(pdf_file, ALLOWED_PDF_TYPES, extensions=PDF_EXTENSIONS)
     except HTTPException as e:
         logger.warning("POST /fields failed: invalid file type filename=%s user_id=%s error=%s",
                       filename, user_id, e.detail)
         raise
     
     try:
-        pdf_bytes = await read_upload_file(pdf_file)
+        # Read in chunks (413 past 10MB) and hash for the mapping cache as we go
+        try:
+            pdf_bytes, pdf_hash = await read_pdf_upload(pdf_file)
+        except HTTPException:
+            logger.warning("POST /fields failed: file too large filename=%s user_id=%s",
+                          filename, user_id)
+            raise
         file_size = len(pdf_bytes)
-        logger.info("POST /fields: filename=%s size=%d bytes content_type=%s authenticated=%s user_id=%s user_email=%s", 
-                    filename, file_size, content_type, is_authenticated, user_id, user_email)
-        
-        # Check file size (10MB limit)
-        if file_size > MAX_UPLOAD_SIZE:
-            logger.warning("POST /fields failed: file too large filename=%s size=%d user_id=%s",
-                          filename, file_size, user_id)
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB."
-            )
-        
-        # Compute PDF hash for mapping cache
-        pdf_hash = db.compute_pdf_hash(pdf_bytes)
+        # Log request and cookie presence for debugging (skip building it when INFO is off)
+        if logger.isEnabledFor(logging.INFO):
+            cookie_keys, session_present, session_prefix = _session_debug(request)
+            logger.info("POST /fields: filename=%s size=%d bytes content_type=%s authenticated=%s user_id=%s user_email=%s cookie_keys=%s session_present=%s session_prefix=%s",
+                        filename, file_size, content_type, is_authenticated, user_id, user_email, cookie_keys, session_present, session_prefix)
         
         # Save uploaded PDF for preview
         ensure_tmp_dir()
@@ -987,14 +1457,16 @@ async def extract_fields(
         try:
             with upload_path.open("wb") as fh:
                 fh.write(pdf_bytes)
+            schedule_expiry(upload_path, UPLOAD_TTL_SECONDS)
             logger.info("Saved uploaded PDF: upload_id=%s path=%s size=%d", upload_id, upload_path, file_size)
         except Exception as e:
             logger.warning("Failed to save uploaded PDF: upload_id=%s error=%s", upload_id, e)
             upload_id = None  # Continue without preview if save fails
         
         try:
-            reader = PdfReader(BytesIO(pdf_bytes))
-            fields_metadata = extract_field_metadata(reader)
+            # Parse off the event loop so concurrent uploads don't serialize
+            reader = await parse_pdf(pdf_bytes)
+            fields_metadata = await run_in_threadpool(extract_field_metadata, reader)
             field_count = len(fields_metadata)
             preview_url_str = f"/preview-upload/{upload_id}" if upload_id else "none"
             logger.info("POST /fields success: filename=%s size=%d fields=%d authenticated=%s user_id=%s upload_id=%s preview_url=%s",
@@ -1021,16 +1493,15 @@ async def extract_fields(
             }
             
             if upload_id:
-                response_data["upload_id"] = upload_id
-                response_data["preview_url"] = f"/preview-upload/{upload_id}"
+                response_data.update(upload_id=upload_id, preview_url=preview_url_str)
             
             # Add plan info if authenticated
             if is_authenticated and user:
-                response_data["is_pro"] = user.get("is_pro", False)
-                response_data["plan"] = "pro" if user.get("is_pro") else "free"
+                user_is_pro = user.get("is_pro", False)
+                response_data.update(is_pro=user_is_pro, plan="pro" if user_is_pro else "free")
             
             # Create response
-            json_response = JSONResponse(response_data)
+            json_response = ORJSONResponse(response_data)
             
             # Set ffai_token cookie if we created a new token for anonymous user
             if new_token_raw and not is_authenticated:
@@ -1073,150 +1544,187 @@ async def extract_fields(
 
 
 @app.post("/analyze")
-async def analyze_pdf(pdf_file: UploadFile = File(...)) -> JSONResponse:
+async def analyze_pdf(pdf_file: UploadFile = File(...)) -> ORJSONResponse:
     """Alias for /fields - extract form fields from a fillable PDF."""
     return await extract_fields(pdf_file)
 
 
+def ai_cache_key(endpoint: str, *parts: Optional[str]) -> bytes:
+    """Digest of model, prompt version and inputs; each part is length-prefixed so
+    boundaries between parts cannot be shifted to collide."""
+    hasher = blake2b(digest_size=32)
+    for part in (AI_MODEL, AI_PROMPT_VERSION, endpoint, *parts):
+        data = (part or "").encode("utf-8")
+        hasher.update(len(data).to_bytes(8, "big"))
+        hasher.update(data)
+    return hasher.digest()
+
+
+def get_cached_ai_response(key: bytes) -> Optional[str]:
+    result_text = _ai_response_cache.get(key)
+    if result_text is not None:
+        _ai_response_cache.move_to_end(key)
+    return result_text
+
+
+def cache_ai_response(key: bytes, result_text: str) -> None:
+    _ai_response_cache[key] = result_text
+    _ai_response_cache.move_to_end(key)
+    while len(_ai_response_cache) > AI_RESPONSE_CACHE_SIZE:
+        _ai_response_cache.popitem(last=False)
+
+
+async def fetch_ai_response(key: bytes, make_request: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+    """Raw model output for key: cached, joined to an identical in-flight call, or requested.
+    
+    Callers validate the text and then store it with cache_ai_response.
+    """
+    result_text = get_cached_ai_response(key)
+    if result_text is not None:
+        return result_text
+    task = _inflight_ai_requests.get(key)
+    # A finished task may still be registered until its done-callback runs;
+    # never hand its (possibly failed) result to a new caller
+    if task is None or task.done():
+        task = asyncio.create_task(make_request())
+        _inflight_ai_requests[key] = task
+        task.add_done_callback(functools.partial(_inflight_ai_done, key))
+    # Shield so one client disconnecting does not cancel the call for the others
+    return await asyncio.shield(task)
+
+
+def _inflight_ai_done(key: bytes, task: "asyncio.Task[Optional[str]]") -> None:
+    if _inflight_ai_requests.get(key) is task:
+        del _inflight_ai_requests[key]
+    # Retrieve the exception even if every waiter was cancelled, so asyncio does
+    # not log "Task exception was never retrieved"; waiters re-raise it themselves
+    if not task.cancelled():
+        task.exception()
+
+
 @app.post("/ai-extract")
 async def ai_extract_fields(
     fields_json: str = Form(...),
     user_text: str = Form(...),
     current_values: Optional[str] = Form(None),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Use AI to extract field values from user text. Only fills empty/missing fields."""
     if not openai_client:
         raise HTTPException(status_code=503, detail="AI extraction is not available. Set OPENAI_API_KEY to enable.")
     
     if not user_text or not user_text.strip():
-        return JSONResponse({"extracted": {}})
+        return ORJSONResponse({"extracted": {}})
     
-    try:
-        fields = json.loads(fields_json)
-        if not isinstance(fields, list):
-            raise ValueError("fields_json must be a list")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid fields_json format.")
+    fields = parse_json_form(fields_json, list, "Invalid fields_json format.")
     
     # Parse current values (already filled by user)
     current_data: Dict[str, Any] = {}
     if current_values and current_values.strip():
         try:
-            current_data = json.loads(current_values.strip())
+            current_data = orjson.loads(current_values)
             if not isinstance(current_data, dict):
                 current_data = {}
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             current_data = {}
     
-    # Build field names list for the prompt, excluding already-filled fields
-    field_names = []
-    empty_field_names = []
-    for field in fields:
-        if not isinstance(field, dict):
-            continue
-        name = field.get("name")
-        if not name:
-            continue
-        field_names.append(name)
-        # Track fields that are empty or not yet filled
-        if name not in current_data or not current_data.get(name):
-            empty_field_names.append(name)
-    
-    if not field_names:
-        return JSONResponse({"extracted": {}})
-    
-    # Only extract values for empty fields
-    if not empty_field_names:
-        return JSONResponse({"extracted": {}})
-    
-    # Create structured output schema only for empty fields
+    # Single pass: collect empty (not yet filled) fields in prompt order and
+    # build the structured output schema for them
+    empty_field_names: set[str] = set()
+    empty_field_order: list[str] = []
     properties = {}
     for field in fields:
         if not isinstance(field, dict):
             continue
         name = field.get("name")
-        if not name or name not in empty_field_names:
+        if not name or current_data.get(name) or name in empty_field_names:
             continue  # Skip already-filled fields
-        field_type = field.get("type", "text")
-        
-        if field_type == "checkbox":
-            properties[name] = {
-                "type": "boolean",
-                "description": f"Value for field '{name}' (true/false)"
-            }
+        empty_field_names.add(name)
+        empty_field_order.append(name)
+        # The property key already names the field, so the schemas are shared
+        if field.get("type", "text") == "checkbox":
+            properties[name] = AI_BOOL_FIELD_SCHEMA
         else:
-            properties[name] = {
-                "type": "string",
-                "description": f"Value for field '{name}'"
-            }
+            properties[name] = AI_TEXT_FIELD_SCHEMA
+    
+    # Only extract values for empty fields
+    if not empty_field_names:
+        return ORJSONResponse({"extracted": {}})
     
+    # Strict structured outputs require every property to be listed as required;
+    # the model answers ""/false for fields it cannot fill and those are dropped below
     schema = {
         "type": "object",
         "properties": properties,
+        "required": empty_field_order,
         "additionalProperties": False
     }
     
     # Build prompt emphasizing not to overwrite existing values
     filled_fields_desc = ", ".join([f"{k}: {v}" for k, v in current_data.items() if v]) if current_data else "none"
     
+    cache_key = ai_cache_key("ai-extract", fields_json, user_text, current_values)
     try:
-        response = openai_client.beta.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that extracts structured information from user text. Only extract values you are confident about. Only fill fields that are currently empty. Never overwrite fields that already have values. Leave fields empty if you cannot determine the value from the text."
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract information from this text and fill ONLY the empty fields listed below. Do NOT fill fields that already have values.\n\nUser text: {user_text}\n\nAlready filled fields (DO NOT change these): {filled_fields_desc}\n\nEmpty fields to fill: {', '.join(empty_field_names)}\n\nReturn only the empty fields you can confidently identify from the text."
-                }
-            ],
-            response_format={"type": "json_schema", "json_schema": {"name": "extracted_fields", "strict": True, "schema": schema}},
-            temperature=0.1,
-        )
-        
-        result_text = response.choices[0].message.content
+        result_text = await fetch_ai_response(cache_key, lambda: _request_ai_extraction(
+            user_text, filled_fields_desc, empty_field_order, schema
+        ))
         if result_text:
-            extracted = json.loads(result_text)
+            extracted = orjson.loads(result_text)
             if isinstance(extracted, dict):
-                # Filter out empty values and ensure we don't overwrite existing values
-                extracted = {
-                    k: v for k, v in extracted.items() 
-                    if v not in (None, "", False) and k in empty_field_names
-                }
-                return JSONResponse({"extracted": extracted})
+                cache_ai_response(cache_key, result_text)
+                # Filter out empty values (schema values are str/bool, so truthiness
+                # covers None/""/False) and ensure we don't overwrite existing values
+                return ORJSONResponse({"extracted": {
+                    k: v for k, v in extracted.items() if v and k in empty_field_names
+                }})
         
-        return JSONResponse({"extracted": {}})
+        return ORJSONResponse({"extracted": {}})
     except Exception as exc:
         logger.warning("AI extraction error: %s", exc)
         raise HTTPException(status_code=500, detail="AI extraction failed. Please fill fields manually.")
 
 
+async def _request_ai_extraction(
+    user_text: str,
+    filled_fields_desc: str,
+    empty_field_order: list[str],
+    schema: Dict[str, Any],
+) -> Optional[str]:
+    """Ask the model for values of the empty fields; returns its raw JSON text."""
+    response = await openai_client.beta.chat.completions.create(
+        model=AI_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that extracts structured information from user text. Only extract values you are confident about. Only fill fields that are currently empty. Never overwrite fields that already have values. Leave fields empty if you cannot determine the value from the text."
+            },
+            {
+                "role": "user",
+                "content": f"Extract information from this text and fill ONLY the empty fields listed below. Do NOT fill fields that already have values.\n\nUser text: {user_text}\n\nAlready filled fields (DO NOT change these): {filled_fields_desc}\n\nEmpty fields to fill: {', '.join(empty_field_order)}\n\nReturn only the empty fields you can confidently identify from the text."
+            }
+        ],
+        response_format={"type": "json_schema", "json_schema": {"name": "extracted_fields", "strict": True, "schema": schema}},
+        temperature=0.1,
+    )
+    return response.choices[0].message.content
+
+
 @app.post("/fill")
 async def fill(
     request: Request,
-    background_tasks: BackgroundTasks,
     pdf_file: UploadFile = File(...),
     fields_json: Optional[str] = Form(None),
     # JSON inputs kept for API/debug use only, not exposed in UI
     json_file: Optional[UploadFile] = File(None),
     json_text: Optional[str] = Form(None),
+    is_pro: bool = Depends(get_is_pro),
+    browser_token: Tuple[str, Optional[str]] = Depends(get_browser_token),
 ):
-    # Determine access tier based on signed cookie.
-    is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
-
     # Handle free-tier usage limits.
-    token_cookie = request.cookies.get("ffai_token")
-    token_raw = _verify_token(token_cookie)
-    new_token_raw: Optional[str] = None
-    if token_raw is None:
-        new_token_raw = secrets.token_urlsafe(16)
-        token_raw = new_token_raw
+    token_raw, new_token_raw = browser_token
     if not is_pro:
         usage_limiter.check_and_increment(token_raw)
 
-    validate_file_type(pdf_file, ALLOWED_PDF_TYPES, extensions=(".pdf",))
+    validate_file_type(pdf_file, ALLOWED_PDF_TYPES, extensions=PDF_EXTENSIONS)
     
     # Primary data source: fields_json from UI form
     data: Dict[str, Any] = {}
@@ -1224,17 +1732,17 @@ async def fill(
     # 1. fields_json (from generated UI form) - primary method
     if fields_json and fields_json.strip():
         try:
-            fields_data = json.loads(fields_json.strip())
+            fields_data = orjson.loads(fields_json)
             if isinstance(fields_data, dict):
                 data.update(fields_data)
                 logger.info("Received fill request: pdf=%s fields_json=provided", pdf_file.filename)
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.warning("Invalid fields_json: %s", fields_json[:100])
             raise HTTPException(status_code=400, detail="Invalid form data. Please try again.")
     
     # 2. json_file (API/debug only - not in UI)
     if json_file is not None and json_file.filename and json_file.filename.strip():
-        validate_file_type(json_file, ALLOWED_JSON_TYPES, extensions=(".json",))
+        validate_file_type(json_file, ALLOWED_JSON_TYPES, extensions=JSON_EXTENSIONS)
         json_bytes = await read_upload_file(json_file)
         file_data = parse_json_payload(json_bytes)
         data.update(file_data)  # fields_json takes precedence
@@ -1243,20 +1751,18 @@ async def fill(
     # 3. json_text (API/debug only - not in UI)
     if json_text and json_text.strip():
         try:
-            text_data = json.loads(json_text.strip())
+            text_data = orjson.loads(json_text)
             if isinstance(text_data, dict):
                 data.update(text_data)  # fields_json and json_file take precedence
                 logger.info("Received fill request: pdf=%s json_text=provided (API)", pdf_file.filename)
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.warning("Invalid json_text")
     
     if not data:
         raise HTTPException(status_code=400, detail="No form field values provided. Please fill the form fields.")
 
-    pdf_bytes = await read_upload_file(pdf_file)
-    
-    # Compute PDF hash for mapping cache
-    pdf_hash = db.compute_pdf_hash(pdf_bytes)
+    # Read in chunks and hash for the mapping cache as the upload arrives
+    pdf_bytes, pdf_hash = await read_pdf_upload(pdf_file)
     
     # Generate unique file ID for preview
     file_id = secrets.token_urlsafe(16)
@@ -1264,64 +1770,63 @@ async def fill(
     preview_path = PREVIEW_DIR / f"{file_id}.pdf"
     original_pdf_path = PREVIEW_DIR / f"{file_id}_original.pdf"
     
-    # Save original PDF for AI fix loop
-    with original_pdf_path.open("wb") as fh:
-        fh.write(pdf_bytes)
-    
-    # Fill PDF and save to preview directory
-    filled_pdf_path = fill_pdf_form(pdf_bytes, data, add_watermark=not is_pro, output_path=preview_path)
+    # Save original PDF for the AI fix loop before returning file_id: /ai-fix
+    # reads it whenever the parse is not cached (another worker, or evicted)
+    await run_in_threadpool(write_bytes, original_pdf_path, pdf_bytes)
+    schedule_expiry(original_pdf_path, PREVIEW_TTL_SECONDS)
+    
+    # Fill PDF and save to preview directory (kept synchronous: the client
+    # fetches /preview/{file_id} right after this response). The parse is kept
+    # so /ai-fix rounds don't re-parse the original.
+    reader = await parse_pdf(pdf_bytes)
+    filled_pdf_path = await run_in_threadpool(
+        fill_pdf_form, None, data,
+        add_watermark=not is_pro, output_path=preview_path, reader=reader
+    )
+    cache_parsed_pdf(file_id, reader)
+    schedule_expiry(preview_path, PREVIEW_TTL_SECONDS)
     
-    file_size = preview_path.stat().st_size
-    logger.info("Generated filled PDF: file_id=%s, path=%s, size=%d bytes, watermark=%s", 
-                file_id, preview_path, file_size, not is_pro)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Generated filled PDF: file_id=%s, path=%s, size=%d bytes, watermark=%s", 
+                    file_id, preview_path, preview_path.stat().st_size, not is_pro)
     
-    # Store metadata (watermark status) in a simple JSON file
+    # Store metadata (watermark status) in a simple JSON file before returning
+    # file_id: /ai-fix on another worker falls back to it, and a missing file
+    # would re-fill with the free watermark
     metadata_path = PREVIEW_DIR / f"{file_id}_meta.json"
-    with metadata_path.open("w") as fh:
-        json.dump({"is_pro": is_pro, "add_watermark": not is_pro}, fh)
+    meta = {"is_pro": is_pro, "add_watermark": not is_pro}
+    await run_in_threadpool(write_json, metadata_path, meta)
+    remember_preview_meta(file_id, meta)
+    schedule_expiry(metadata_path, PREVIEW_TTL_SECONDS)
 
-    response = JSONResponse({
+    response = ORJSONResponse({
         "preview_url": f"/preview/{file_id}",
         "download_url": f"/download/{file_id}",
         "file_id": file_id,
         "pdf_hash": pdf_hash
     })
-    
-    if new_token_raw:
-        response.set_cookie(
-            key="ffai_token",
-            value=_sign_token(new_token_raw),
-            httponly=True,
-            secure=False,
-            samesite="lax",
-            max_age=60 * 60 * 24 * 30,
-        )
-    
+    set_browser_token_cookie(response, new_token_raw)
     return response
 
 
-@app.get("/api/debug/env")
-async def debug_env() -> JSONResponse:
+@debug_router.get("/api/debug/env")
+async def debug_env() -> ORJSONResponse:
     """Debug endpoint to check environment variables (dev only)."""
-    if IS_PRODUCTION:
-        raise HTTPException(status_code=404, detail="Not found")
-    
-    database_url = os.getenv("DATABASE_URL")
-    return JSONResponse({
-        "hasDatabaseUrl": bool(database_url),
+    return ORJSONResponse({
+        "hasDatabaseUrl": DATABASE_URL_SET,
         "env": "prod" if IS_PRODUCTION else "dev",
-        "databaseUrlPresent": bool(database_url)
+        "databaseUrlPresent": DATABASE_URL_SET
     })
 
 
 @app.get("/api/config")
-async def get_config() -> JSONResponse:
+async def get_config() -> ORJSONResponse:
     """Get application configuration (feature flags, environment)."""
     stripe_enabled = bool(STRIPE_SECRET_KEY and STRIPE_PRICE_ID)
     openai_enabled = bool(OPENAI_AVAILABLE and OPENAI_API_KEY)
     env_name = "prod" if IS_PRODUCTION else "dev"
     
-    return JSONResponse({
+    return ORJSONResponse({
         "stripeEnabled": stripe_enabled,
         "openaiEnabled": openai_enabled,
         "env": env_name
@@ -1329,35 +1834,36 @@ async def get_config() -> JSONResponse:
 
 
 @app.get("/api/me")
-async def get_me(request: Request) -> JSONResponse:
+async def get_me(request: Request) -> ORJSONResponse:
     """Get current user information including email and plan (free/pro)."""
-    # Log cookie presence for debugging
-    cookie_keys = list(request.cookies.keys())
-    session_cookie = request.cookies.get("session")
-    session_present = bool(session_cookie)
-    session_prefix = session_cookie[:8] if session_cookie and len(session_cookie) >= 8 else None
-    
-    # Log backend consistency
-    db_backend = db.get_db_backend_name()
-    database_url_set = bool(os.getenv("DATABASE_URL"))
-    logger.info("GET /api/me: cookie_keys=%s session_present=%s session_prefix=%s backend=%s DATABASE_URL=%s ENV=%s DEBUG=%s IS_PRODUCTION=%s",
-                cookie_keys, session_present, session_prefix, db_backend, database_url_set, ENV or "not set", DEBUG, IS_PRODUCTION)
+    # Debug logging below (including the extra session lookup) only runs when INFO is enabled
+    log_info = logger.isEnabledFor(logging.INFO)
+    if log_info:
+        # Log cookie presence and backend consistency
+        cookie_keys, session_present, session_prefix = _session_debug(request)
+        db_backend = DB_BACKEND_NAME
+        database_url_set = DATABASE_URL_SET
+        logger.info("GET /api/me: cookie_keys=%s session_present=%s session_prefix=%s backend=%s DATABASE_URL=%s ENV=%s DEBUG=%s IS_PRODUCTION=%s",
+                    cookie_keys, session_present, session_prefix, db_backend, database_url_set, ENV or "not set", DEBUG, IS_PRODUCTION)
     
     user = await get_current_user_async(request)
     
-    # Check if session was found in DB
-    session_found = False
-    if session_cookie:
-        try:
-            session = await db.get_session(session_cookie)
-            session_found = session is not None
-        except Exception as e:
-            logger.warning("GET /api/me: error looking up session: %s", e)
+    if log_info:
+        # Check if session was found in DB
+        session_found = False
+        session_cookie = request.cookies.get("session")
+        if session_cookie:
+            try:
+                session = await db.get_session(session_cookie)
+                session_found = session is not None
+            except Exception as e:
+                logger.warning("GET /api/me: error looking up session: %s", e)
     
     if not user:
-        logger.info("GET /api/me: not authenticated session_present=%s session_prefix=%s session_found=%s",
-                    session_present, session_prefix, session_found)
-        return JSONResponse({
+        if log_info:
+            logger.info("GET /api/me: not authenticated session_present=%s session_prefix=%s session_found=%s",
+                        session_present, session_prefix, session_found)
+        return ORJSONResponse({
             "authenticated": False
         })
     
@@ -1370,13 +1876,14 @@ async def get_me(request: Request) -> JSONResponse:
     plan = "pro" if is_pro else "free"
     
     # Log successful authentication lookup with session lookup result
-    logger.info("GET /api/me: authenticated session_present=%s session_prefix=%s session_found=%s user_id=%s email=%s plan=%s backend=%s",
-                session_present, session_prefix, session_found, user.get("id"), user.get("email"), plan, db_backend)
+    if log_info:
+        logger.info("GET /api/me: authenticated session_present=%s session_prefix=%s session_found=%s user_id=%s email=%s plan=%s backend=%s",
+                    session_present, session_prefix, session_found, user.get("id"), user.get("email"), plan, db_backend)
     
     # Check Stripe configuration
     stripe_enabled = bool(STRIPE_SECRET_KEY and STRIPE_PRICE_ID)
     
-    return JSONResponse({
+    return ORJSONResponse({
         "authenticated": True,
         "email": user["email"],
         "plan": plan,
@@ -1533,9 +2040,7 @@ async def update_email(request: Request) -> JSONResponse:
             raise HTTPException(status_code=400, detail="new_email is required")
         
         # Validate email format
-        import re
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, new_email):
+        if not EMAIL_RE.match(new_email):
             raise HTTPException(status_code=400, detail="Invalid email format")
         
         current_email = user.get("email", "").lower()
@@ -1620,7 +2125,8 @@ async def create_billing_portal(request: Request) -> JSONResponse:
         public_base_url = get_env("PUBLIC_BASE_URL") or str(request.base_url).rstrip('/')
         
         # Create billing portal session
-        portal_session = stripe.billing_portal.Session.create(
+        portal_session = await run_in_threadpool(
+            stripe.billing_portal.Session.create,
             customer=stripe_customer_id,
             return_url=f"{public_base_url}/",
         )
@@ -1636,7 +2142,9 @@ async def create_billing_portal(request: Request) -> JSONResponse:
 
 
 @app.post("/create-checkout-session")
-async def create_checkout_session(request: Request):
+async def create_checkout_session(
+    browser_token: Tuple[str, Optional[str]] = Depends(get_browser_token),
+):
     if not (STRIPE_SECRET_KEY and STRIPE_PRICE_ID):
         logger.info("Checkout session requested but Stripe is not configured.")
         raise HTTPException(
@@ -1644,16 +2152,12 @@ async def create_checkout_session(request: Request):
             detail="Payments are not configured in this environment."
         )
 
-    # Ensure we have a stable browser token to associate with the checkout session.
-    token_cookie = request.cookies.get("ffai_token")
-    token_raw = _verify_token(token_cookie)
-    new_token_raw: Optional[str] = None
-    if token_raw is None:
-        new_token_raw = secrets.token_urlsafe(16)
-        token_raw = new_token_raw
+    # Stable browser token to associate with the checkout session.
+    token_raw, new_token_raw = browser_token
 
     try:
-        session = stripe.checkout.Session.create(
+        session = await run_in_threadpool(
+            stripe.checkout.Session.create,
             mode="subscription",
             line_items=[{"price": STRIPE_PRICE_ID, "quantity": 1}],
             client_reference_id=token_raw,
@@ -1665,15 +2169,7 @@ async def create_checkout_session(request: Request):
         raise HTTPException(status_code=500, detail="Unable to start checkout.")
 
     response = RedirectResponse(url=session.url, status_code=303)
-    if new_token_raw:
-        response.set_cookie(
-            key="ffai_token",
-            value=_sign_token(new_token_raw),
-            httponly=True,
-            secure=False,
-            samesite="lax",
-            max_age=60 * 60 * 24 * 30,
-        )
+    set_browser_token_cookie(response, new_token_raw)
     return response
 
 
@@ -1688,7 +2184,7 @@ async def stripe_success(request: Request):
         raise HTTPException(status_code=400, detail="Missing session_id.")
 
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = await run_in_threadpool(stripe.checkout.Session.retrieve, session_id)
     except Exception as exc:  # noqa: BLE001
         logger.warning("Error retrieving Stripe session: %s", exc)
         raise HTTPException(status_code=400, detail="Invalid session.")
@@ -1703,7 +2199,7 @@ async def stripe_success(request: Request):
         raise HTTPException(status_code=400, detail="No subscription found for session.")
 
     try:
-        subscription = stripe.Subscription.retrieve(sub_id)
+        subscription = await run_in_threadpool(stripe.Subscription.retrieve, sub_id)
     except Exception as exc:  # noqa: BLE001
         logger.warning("Error retrieving Stripe subscription: %s", exc)
         raise HTTPException(status_code=400, detail="Invalid subscription.")
@@ -1750,7 +2246,7 @@ async def stripe_refresh(request: Request) -> RedirectResponse:
         return resp
 
     try:
-        subscription = stripe.Subscription.retrieve(sub_id)
+        subscription = await run_in_threadpool(stripe.Subscription.retrieve, sub_id)
     except Exception as exc:  # noqa: BLE001
         logger.warning("Error retrieving Stripe subscription during refresh: %s", exc)
         return RedirectResponse(url="/?pro_refresh=error", status_code=303)
@@ -1842,18 +2338,34 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 
+def accel_redirect_response(name: str, headers: Dict[str, str]) -> Response:
+    """Hand a PREVIEW_DIR file off to nginx via X-Accel-Redirect."""
+    return Response(
+        media_type="application/pdf",
+        headers={"X-Accel-Redirect": f"{PREVIEW_ACCEL_REDIRECT_PREFIX}/{name}", **headers},
+    )
+
+
 @app.get("/preview/{file_id}")
-async def preview_pdf(file_id: str, request: Request) -> FileResponse:
+async def preview_pdf(file_id: str, request: Request) -> Response:
     """Return PDF for inline preview with proper headers for iframe rendering."""
     ensure_tmp_dir()
     preview_path = PREVIEW_DIR / f"{file_id}.pdf"
     
-    if not preview_path.exists():
+    try:
+        preview_stat = preview_path.stat()
+    except FileNotFoundError:
         logger.warning("Preview not found: file_id=%s", file_id)
         raise HTTPException(status_code=404, detail="Preview not found or expired.")
     
-    file_size = preview_path.stat().st_size
-    logger.info("Serving preview: file_id=%s, size=%d bytes", file_id, file_size)
+    logger.info("Serving preview: file_id=%s, size=%d bytes", file_id, preview_stat.st_size)
+    
+    if PREVIEW_ACCEL_REDIRECT_PREFIX:
+        return accel_redirect_response(f"{file_id}.pdf", {
+            "Content-Disposition": 'inline; filename="preview.pdf"',
+            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+            "X-Frame-Options": "SAMEORIGIN"
+        })
     
     # Use FileResponse with inline disposition for iframe rendering
     # Content-Type: application/pdf is set automatically by FileResponse
@@ -1863,6 +2375,7 @@ async def preview_pdf(file_id: str, request: Request) -> FileResponse:
         path=preview_path,
         media_type="application/pdf",
         filename="preview.pdf",
+        stat_result=preview_stat,
         headers={
             "Content-Disposition": 'inline; filename="preview.pdf"',
             "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
@@ -1885,23 +2398,25 @@ async def preview_pdf(file_id: str, request: Request) -> FileResponse:
 
 
 @app.get("/preview-upload/{upload_id}")
-async def preview_upload_pdf(upload_id: str, request: Request) -> FileResponse:
+async def preview_upload_pdf(upload_id: str, request: Request) -> Response:
     """Return uploaded PDF for inline preview with proper headers for iframe rendering."""
     ensure_tmp_dir()
     upload_path = UPLOAD_DIR / f"{upload_id}.pdf"
     
-    if not upload_path.exists():
+    try:
+        upload_stat = upload_path.stat()
+    except FileNotFoundError:
         logger.warning("Upload preview not found: upload_id=%s", upload_id)
         raise HTTPException(status_code=404, detail="Upload preview not found or expired.")
     
-    file_size = upload_path.stat().st_size
-    logger.info("Serving upload preview: upload_id=%s, size=%d bytes", upload_id, file_size)
+    logger.info("Serving upload preview: upload_id=%s, size=%d bytes", upload_id, upload_stat.st_size)
     
     # Use FileResponse with inline disposition for iframe rendering
     response = FileResponse(
         path=upload_path,
         media_type="application/pdf",
         filename="uploaded.pdf",
+        stat_result=upload_stat,
         headers={
             "Content-Disposition": 'inline; filename="uploaded.pdf"',
             "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
@@ -1919,44 +2434,53 @@ async def preview_upload_pdf(upload_id: str, request: Request) -> FileResponse:
 
 
 @app.get("/download/{file_id}")
-async def download_pdf(file_id: str) -> FileResponse:
+async def download_pdf(file_id: str) -> Response:
     """Return PDF with download disposition."""
     ensure_tmp_dir()
     preview_path = PREVIEW_DIR / f"{file_id}.pdf"
     
-    if not preview_path.exists():
+    try:
+        preview_stat = preview_path.stat()
+    except FileNotFoundError:
         logger.warning("Download requested for non-existent file: file_id=%s", file_id)
         raise HTTPException(status_code=404, detail="File not found or expired.")
     
-    file_size = preview_path.stat().st_size
-    logger.info("Serving download: file_id=%s, size=%d bytes", file_id, file_size)
+    logger.info("Serving download: file_id=%s, size=%d bytes", file_id, preview_stat.st_size)
+    
+    if PREVIEW_ACCEL_REDIRECT_PREFIX:
+        return accel_redirect_response(f"{file_id}.pdf", {
+            "Content-Disposition": 'attachment; filename="filled_form.pdf"'
+        })
     
     response = FileResponse(
         path=preview_path,
         media_type="application/pdf",
         filename="filled_form.pdf",
+        stat_result=preview_stat,
     )
     response.headers["Content-Disposition"] = 'attachment; filename="filled_form.pdf"'
     return response
 
 
 @app.get("/download-upload/{upload_id}")
-async def download_upload_pdf(upload_id: str) -> FileResponse:
+async def download_upload_pdf(upload_id: str) -> Response:
     """Return uploaded PDF with download disposition."""
     ensure_tmp_dir()
     upload_path = UPLOAD_DIR / f"{upload_id}.pdf"
     
-    if not upload_path.exists():
+    try:
+        upload_stat = upload_path.stat()
+    except FileNotFoundError:
         logger.warning("Download requested for non-existent upload: upload_id=%s", upload_id)
         raise HTTPException(status_code=404, detail="Upload not found or expired.")
     
-    file_size = upload_path.stat().st_size
-    logger.info("Serving upload download: upload_id=%s, size=%d bytes", upload_id, file_size)
+    logger.info("Serving upload download: upload_id=%s, size=%d bytes", upload_id, upload_stat.st_size)
     
     response = FileResponse(
         path=upload_path,
         media_type="application/pdf",
         filename="uploaded.pdf",
+        stat_result=upload_stat,
     )
     response.headers["Content-Disposition"] = 'attachment; filename="uploaded.pdf"'
     return response
@@ -1968,7 +2492,7 @@ async def ai_fix_pdf(
     fields_json: str = Form(...),
     current_values: str = Form(...),
     feedback: str = Form(...),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Apply AI corrections to a preview PDF based on user feedback."""
     if not openai_client:
         raise HTTPException(status_code=503, detail="AI correction is not available. Set OPENAI_API_KEY to enable.")
@@ -1981,85 +2505,72 @@ async def ai_fix_pdf(
     original_pdf_path = PREVIEW_DIR / f"{file_id}_original.pdf"
     metadata_path = PREVIEW_DIR / f"{file_id}_meta.json"
     
-    if not preview_path.exists() or not original_pdf_path.exists():
-        raise HTTPException(status_code=404, detail="Preview not found or expired.")
-    
     try:
-        fields = json.loads(fields_json)
-        current_data = json.loads(current_values)
+        fields = orjson.loads(fields_json)
+        current_data = orjson.loads(current_values)
         if not isinstance(fields, list) or not isinstance(current_data, dict):
             raise ValueError("Invalid data format")
-    except (json.JSONDecodeError, ValueError):
+    except ValueError:  # orjson.JSONDecodeError is a ValueError subclass
         raise HTTPException(status_code=400, detail="Invalid form data.")
     
-    # Read original PDF
-    with original_pdf_path.open("rb") as fh:
-        pdf_bytes = fh.read()
+    # Reuse the parsed original when cached, else read it from disk (reading
+    # it doubles as the existence check; it is at most MAX_UPLOAD_SIZE)
+    cached = get_cached_parsed_pdf(file_id)
+    original_pdf_bytes = None
+    try:
+        if cached is None:
+            original_pdf_bytes = original_pdf_path.read_bytes()
+        os.stat(preview_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Preview not found or expired.")
     
     # Read metadata
-    add_watermark = True  # Default
-    if metadata_path.exists():
-        try:
-            with metadata_path.open("r") as fh:
-                meta = json.load(fh)
-                add_watermark = meta.get("add_watermark", True)
-        except Exception:
-            pass
+    meta = load_preview_meta(file_id, metadata_path)
+    add_watermark = meta.get("add_watermark", True)
     
     # Build AI prompt with exact system message
-    field_list = []
-    for field in fields:
-        if isinstance(field, dict):
-            name = field.get("name", "")
-            current_val = current_data.get(name, "")
-            field_list.append(f"- {name}: {current_val}")
-    
-    field_list_str = "\n".join(field_list)
+    get_current = current_data.get
+    field_list_str = "\n".join(
+        f"- {field['name']}: {get_current(field['name'], '')}"
+        for field in fields
+        if isinstance(field, dict) and field.get("name")
+    )
     
+    cache_key = ai_cache_key("ai-fix", fields_json, current_values, feedback)
     try:
-        response = openai_client.beta.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are editing values in a PDF form.\nYou are given:\n- A list of form fields with their current values\n- A user instruction describing what to fix\n\nRules:\n- Only change fields that the user explicitly or implicitly refers to\n- Do not invent new data\n- Do not remove data unless asked\n- Return ONLY valid JSON with updated fields\n- Preserve all untouched fields exactly as-is"
-                },
-                {
-                    "role": "user",
-                    "content": f"Current form field values:\n{field_list_str}\n\nUser instruction: {feedback}\n\nReturn a JSON object with ONLY the fields that need to be changed. Preserve all other fields exactly as they are."
-                }
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1,
-        )
-        
-        result_text = response.choices[0].message.content
+        result_text = await fetch_ai_response(cache_key, lambda: _request_ai_fix(field_list_str, feedback))
         if not result_text:
             raise ValueError("Empty AI response")
         
-        corrections = json.loads(result_text)
+        corrections = orjson.loads(result_text)
         if not isinstance(corrections, dict):
             raise ValueError("Invalid AI response format")
+        cache_ai_response(cache_key, result_text)
         
         # Merge corrections with current values (corrections take precedence)
-        updated_data = current_data.copy()
-        updated_data.update(corrections)
+        updated_data = current_data | corrections
         
-        # Regenerate PDF with corrections
-        fill_pdf_form(pdf_bytes, updated_data, add_watermark=add_watermark, output_path=preview_path)
+        # Regenerate PDF with corrections from the cached parse
+        if cached is None:
+            cached = cache_parsed_pdf(file_id, await parse_pdf(original_pdf_bytes))
+        reader, reader_lock = cached
+        await run_in_threadpool(
+            run_locked, reader_lock, fill_pdf_form, None, updated_data,
+            add_watermark=add_watermark, output_path=preview_path, reader=reader
+        )
         
         file_size = preview_path.stat().st_size
         logger.info("AI fix applied: file_id=%s, updated_fields=%s, size=%d bytes", 
                     file_id, list(corrections.keys()), file_size)
         
-        return JSONResponse({
+        return ORJSONResponse({
             "success": True,
             "preview_url": f"/preview/{file_id}",
             "file_id": file_id,
             "updated_fields": list(corrections.keys())
         })
         
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         logger.warning("AI returned invalid JSON")
         raise HTTPException(status_code=500, detail="AI returned invalid response. Please try again.")
     except Exception as exc:
@@ -2067,7 +2578,45 @@ async def ai_fix_pdf(
         raise HTTPException(status_code=500, detail="AI correction failed. Please try again.")
 
 
-async def send_email_via_resend_api(to_email: str, subject: str, html: str, from_email: str, from_raw: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+async def _request_ai_fix(field_list_str: str, feedback: str) -> Optional[str]:
+    """Ask the model which field values to change; returns its raw JSON text."""
+    response = await openai_client.beta.chat.completions.create(
+        model=AI_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": "You are editing values in a PDF form.\nYou are given:\n- A list of form fields with their current values\n- A user instruction describing what to fix\n\nRules:\n- Only change fields that the user explicitly or implicitly refers to\n- Do not invent new data\n- Do not remove data unless asked\n- Return ONLY valid JSON with updated fields\n- Preserve all untouched fields exactly as-is"
+            },
+            {
+                "role": "user",
+                "content": f"Current form field values:\n{field_list_str}\n\nUser instruction: {feedback}\n\nReturn a JSON object with ONLY the fields that need to be changed. Preserve all other fields exactly as they are."
+            }
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.1,
+    )
+    return response.choices[0].message.content
+
+
+# Failure category returned alongside the error message by the send functions
+EmailErrorType = Literal["timeout", "connection", "api_error", "auth", "unknown"]
+
+RESEND_MAX_ATTEMPTS = 3
+RESEND_RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def get_resend_client() -> httpx.AsyncClient:
+    """Return the shared Resend API client, creating it on first use."""
+    global _resend_client
+    if _resend_client is None:
+        _resend_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+    return _resend_client
+
+
+async def send_email_via_resend_api(to_email: str, subject: str, html: str, from_email: str, from_raw: Optional[str] = None) -> Tuple[bool, Optional[str], Optional[EmailErrorType]]:
     """Send email via Resend HTTP API.
     
     Args:
@@ -2078,22 +2627,24 @@ async def send_email_via_resend_api(to_email: str, subject: str, html: str, from
         from_raw: Optional raw FROM string (supports "Name <email>")
     
     Returns:
-        Tuple[bool, Optional[str]]: (success, error_message)
-        - If successful: (True, None)
-        - If failed: (False, safe_error_message)
+        Tuple[bool, Optional[str], Optional[EmailErrorType]]: (success, error_message, error_type)
+        - If successful: (True, None, None)
+        - If failed: (False, safe_error_message, error_type)
     """
-    import httpx
-    
-    resend_api_key = get_env("RESEND_API_KEY")
+    # Startup-cached config; env does not change while the process runs
+    resend_api_key = get_email_config()["resend_api_key"]
     if not resend_api_key:
-        return (False, "RESEND_API_KEY not configured")
+        return (False, "RESEND_API_KEY not configured", "unknown")
     
     # Use from_raw if available (supports "Name <email>"), otherwise use from_email
     from_address = from_raw if from_raw else from_email
     
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
+    last_error = None
+    last_error_type: EmailErrorType = "unknown"
+    for attempt in range(1, RESEND_MAX_ATTEMPTS + 1):
+        retry_after = None
+        try:
+            response = await get_resend_client().post(
                 "https://api.resend.com/emails",
                 headers={
                     "Authorization": f"Bearer {resend_api_key}",
@@ -2107,30 +2658,156 @@ async def send_email_via_resend_api(to_email: str, subject: str, html: str, from
                 }
             )
             
-            if response.status_code == 200:
+            # Any 2xx (Resend may answer 202 Accepted) is success; no body parse needed
+            if 200 <= response.status_code < 300:
                 logger.info("Email sent via Resend API to %s", to_email)
-                return (True, None)
-            else:
-                # Log status code only (no secrets)
-                error_detail = f"Resend API error: status {response.status_code}"
+                return (True, None, None)
+            
+            # Log status code only (no secrets)
+            last_error = f"Resend API error: status {response.status_code}"
+            last_error_type = "auth" if response.status_code in (401, 403) else "api_error"
+            # Only parse JSON error bodies (5xx are often HTML pages), bounded in size
+            if response.headers.get("content-type", "").startswith("application/json"):
                 try:
-                    error_data = response.json()
-                    if "message" in error_data:
-                        error_detail = f"Resend API error: {error_data['message'][:100]}"
-                except:
+                    error_data = orjson.loads(response.content[:4096])
+                    if isinstance(error_data, dict) and "message" in error_data:
+                        last_error = f"Resend API error: {str(error_data['message'])[:100]}"
+                except orjson.JSONDecodeError:
                     pass
-                logger.error("Resend API send failed: status=%d", response.status_code)
-                return (False, error_detail)
-                
-    except httpx.TimeoutException:
-        logger.error("Resend API timeout")
-        return (False, "Resend API timeout")
-    except Exception as e:
-        logger.error("Resend API error: %s", e)
-        return (False, f"Resend API error: {str(e)[:100]}")
+            logger.error("Resend API send failed: status=%d (attempt %d/%d)", response.status_code, attempt, RESEND_MAX_ATTEMPTS)
+            if response.status_code not in RESEND_RETRYABLE_STATUSES:
+                return (False, last_error, last_error_type)
+            retry_after = response.headers.get("Retry-After")
+        except httpx.TimeoutException:
+            logger.error("Resend API timeout (attempt %d/%d)", attempt, RESEND_MAX_ATTEMPTS)
+            last_error = "Resend API timeout"
+            last_error_type = "timeout"
+        except httpx.TransportError as e:
+            logger.error("Resend API connection error (attempt %d/%d): %s", attempt, RESEND_MAX_ATTEMPTS, e)
+            last_error = f"Resend API error: {str(e)[:100]}"
+            last_error_type = "connection"
+        except Exception as e:
+            logger.error("Resend API error: %s", e)
+            return (False, f"Resend API error: {str(e)[:100]}", "unknown")
+        
+        # Transient failure: honor Retry-After, else exponential backoff with jitter
+        if attempt < RESEND_MAX_ATTEMPTS:
+            if retry_after and retry_after.isdigit():
+                delay = min(30.0, float(retry_after))
+            else:
+                delay = min(30.0, 1.0 * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+            await asyncio.sleep(delay)
+    
+    return (False, last_error, last_error_type)
+
+async def send_email_hedged(
+    to_email: str,
+    subject: str,
+    html: str,
+    from_email: str,
+    from_raw: Optional[str],
+    smtp_config: Dict[str, Any],
+) -> Tuple[bool, Optional[str], Optional[EmailErrorType], str]:
+    """Send via Resend, hedging with SMTP if Resend hasn't finished in EMAIL_HEDGE_DELAY_SECONDS.
+    
+    Returns (success, error_message, error_type, method_used). The first successful send
+    wins and the other attempt is cancelled. Only for idempotent mail such as
+    magic links, where a duplicate delivery is harmless.
+    """
+    resend_task = asyncio.create_task(send_email_via_resend_api(
+        to_email=to_email, subject=subject, html=html, from_email=from_email, from_raw=from_raw
+    ))
+    done, _ = await asyncio.wait({resend_task}, timeout=EMAIL_HEDGE_DELAY_SECONDS)
+    if done:
+        email_sent, _, _ = resend_task.result()
+        if email_sent:
+            return (True, None, None, "resend_api")
+        # Resend failed fast - plain fallback
+        email_sent, error_msg, error_type = await send_email_via_smtp(to_email, subject, html, smtp_config=smtp_config)
+        return (email_sent, error_msg, error_type, "smtp")
+    
+    logger.info("Resend slower than %.1fs; hedging with SMTP", EMAIL_HEDGE_DELAY_SECONDS)
+    smtp_task = asyncio.create_task(send_email_via_smtp(to_email, subject, html, smtp_config=smtp_config))
+    pending = {resend_task, smtp_task}
+    error_msg = None
+    error_type = None
+    method_used = "smtp"
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            email_sent, task_error, task_error_type = task.result()
+            method_used = "resend_api" if task is resend_task else "smtp"
+            if email_sent:
+                for other in pending:
+                    other.cancel()
+                return (True, None, None, method_used)
+            error_msg, error_type = task_error, task_error_type
+    return (False, error_msg, error_type, method_used)
+
+
+async def _close_smtp(server: aiosmtplib.SMTP) -> None:
+    try:
+        await server.quit()
+    except (aiosmtplib.SMTPException, OSError):
+        server.close()
 
 
-async def send_email_via_smtp(to_email: str, subject: str, body: str, smtp_config: Optional[Dict[str, Any]] = None) -> Tuple[bool, Optional[str]]:
+async def _acquire_smtp(host: str, port: int, user: str, pass_val: str) -> Tuple[aiosmtplib.SMTP, int]:
+    """Get a logged-in SMTP connection from the pool, or open a new one.
+    
+    Returns (server, messages_sent). Pooled connections are checked with NOOP.
+    """
+    idle = _smtp_pool.get((host, port, user))
+    while idle:
+        server, last_used, sent = idle.pop()
+        if time.monotonic() - last_used < SMTP_IDLE_TIMEOUT_SECONDS:
+            try:
+                if (await server.noop()).code == 250:
+                    return server, sent
+            except (aiosmtplib.SMTPException, OSError):
+                pass
+        await _close_smtp(server)
+    
+    # STARTTLS explicitly, as before
+    server = aiosmtplib.SMTP(hostname=host, port=port, timeout=SMTP_IO_TIMEOUT, start_tls=False)
+    await server.connect()
+    try:
+        await server.starttls()
+        await server.login(user, pass_val)
+    except BaseException:
+        server.close()
+        raise
+    return server, 0
+
+
+async def _release_smtp(host: str, port: int, user: str, server: aiosmtplib.SMTP, sent: int) -> None:
+    """Return a healthy connection to the pool (or close it if retired / pool full)."""
+    if sent < SMTP_MAX_MESSAGES_PER_CONN:
+        idle = _smtp_pool.setdefault((host, port, user), [])
+        if len(idle) < SMTP_POOL_MAX_IDLE:
+            idle.append((server, time.monotonic(), sent))
+            return
+    await _close_smtp(server)
+
+
+async def evict_idle_smtp_connections() -> None:
+    """Close pooled SMTP connections idle longer than SMTP_IDLE_TIMEOUT_SECONDS."""
+    cutoff = time.monotonic() - SMTP_IDLE_TIMEOUT_SECONDS
+    stale = []
+    for idle in _smtp_pool.values():
+        stale.extend(entry[0] for entry in idle if entry[1] < cutoff)
+        idle[:] = [entry for entry in idle if entry[1] >= cutoff]
+    for server in stale:
+        await _close_smtp(server)
+
+
+async def periodic_smtp_eviction() -> None:
+    while True:
+        await asyncio.sleep(SMTP_IDLE_TIMEOUT_SECONDS)
+        await evict_idle_smtp_connections()
+
+
+async def send_email_via_smtp(to_email: str, subject: str, body: str, smtp_config: Optional[Dict[str, Any]] = None) -> Tuple[bool, Optional[str], Optional[EmailErrorType]]:
     """Send email via SMTP with retry logic. 
     
     Args:
@@ -2140,11 +2817,11 @@ async def send_email_via_smtp(to_email: str, subject: str, body: str, smtp_confi
         smtp_config: Optional SMTP config dict from get_smtp_config(). If None, calls get_smtp_config().
     
     Returns:
-        Tuple[bool, Optional[str]]: (success, error_message)
-        - If successful: (True, None)
-        - If failed: (False, safe_error_message)
+        Tuple[bool, Optional[str], Optional[EmailErrorType]]: (success, error_message, error_type)
+        - If successful: (True, None, None)
+        - If failed: (False, safe_error_message, error_type)
     
-    Uses connection timeout (10s) and handles all SMTP errors robustly.
+    Each SMTP operation is bounded by SMTP_IO_TIMEOUT and all SMTP errors are handled robustly.
     """
     # Get fresh SMTP config if not provided
     if smtp_config is None:
@@ -2154,7 +2831,7 @@ async def send_email_via_smtp(to_email: str, subject: str, body: str, smtp_confi
     if not smtp_config["configured"]:
         missing_keys_str = ", ".join(smtp_config["missing_keys"])
         logger.warning("SMTP not configured: missing keys=%s", missing_keys_str)
-        return (False, f"SMTP not configured: missing {missing_keys_str}")
+        return (False, f"SMTP not configured: missing {missing_keys_str}", "unknown")
     
     # Extract config values
     host = smtp_config["host"]
@@ -2164,91 +2841,90 @@ async def send_email_via_smtp(to_email: str, subject: str, body: str, smtp_confi
     from_email = smtp_config["from"]
     port = smtp_config["port"]
     
-    def _send_sync():
-        """Synchronous SMTP send function to run in thread pool."""
-        try:
-            # Create message
-            msg = MIMEMultipart()
-            # Use raw FROM if available (supports "Name <email>"), otherwise use extracted email
-            msg['From'] = from_raw if from_raw else from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body
-            msg.attach(MIMEText(body, 'html'))
-            
-            # Connect with timeout (10 seconds for connection)
-            # Note: send_message may take additional time, but connection is established within timeout
-            with smtplib.SMTP(host, port, timeout=10) as server:
-                # Enable TLS with timeout
-                server.starttls()
-                # Login with timeout handling
-                server.login(user, pass_val)
-                # Send message - use extracted email for from_addr
-                server.send_message(msg, from_addr=from_email, to_addrs=[to_email])
-            
-            return (True, None)
-        except (smtplib.SMTPException, smtplib.SMTPAuthenticationError, 
-                smtplib.SMTPConnectError, smtplib.SMTPDataError,
-                smtplib.SMTPHeloError, smtplib.SMTPRecipientsRefused,
-                smtplib.SMTPSenderRefused, smtplib.SMTPServerDisconnected) as e:
-            # Re-raise SMTP-specific exceptions to be caught by retry logic
-            raise
-        except (ConnectionError, TimeoutError, OSError) as e:
-            # Network/connection errors - will be retried
-            raise
-        except Exception as e:
-            # Unexpected errors - log and re-raise for retry logic
-            logger.error("Unexpected error in SMTP send function: %s", e, exc_info=True)
-            raise
+    # Single-part HTML message: no multipart wrapper or boundary to generate
+    msg = MIMEText(body, 'html')
+    # Use raw FROM if available (supports "Name <email>"), otherwise use extracted email
+    msg['From'] = from_raw if from_raw else from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
     
     # Retry logic: up to 3 attempts (initial + 2 retries)
     max_attempts = 3
     last_error = None
+    last_error_type: EmailErrorType = "unknown"
     for attempt in range(1, max_attempts + 1):
         try:
-            # Run SMTP send in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(_smtp_executor, _send_sync)
-            if result[0]:  # result is now a tuple (bool, Optional[str])
-                if attempt > 1:
-                    logger.info("SMTP email sent successfully to %s on attempt %d", to_email, attempt)
-                else:
-                    logger.info("Email sent via SMTP to %s", to_email)
-                return (True, None)
-        except (smtplib.SMTPException, smtplib.SMTPAuthenticationError,
-                smtplib.SMTPConnectError, smtplib.SMTPDataError,
-                smtplib.SMTPHeloError, smtplib.SMTPRecipientsRefused,
-                smtplib.SMTPSenderRefused, smtplib.SMTPServerDisconnected) as e:
+            # Reuse a pooled, already logged-in connection (native asyncio, no thread)
+            server, sent = await _acquire_smtp(host, port, user, pass_val)
+            try:
+                # Send message - use extracted email as envelope sender
+                await server.send_message(msg, sender=from_email, recipients=[to_email])
+            except BaseException:
+                server.close()
+                raise
+            await _release_smtp(host, port, user, server, sent + 1)
+            
+            if attempt > 1:
+                logger.info("SMTP email sent successfully to %s on attempt %d", to_email, attempt)
+            else:
+                logger.info("Email sent via SMTP to %s", to_email)
+            return (True, None, None)
+        except aiosmtplib.SMTPException as e:
             # Create safe error message (no sensitive data)
             error_msg = f"SMTP error: {type(e).__name__}"
-            if hasattr(e, 'smtp_code') and e.smtp_code:
-                error_msg += f" (code {e.smtp_code})"
-            if hasattr(e, 'smtp_error') and e.smtp_error:
-                # Only include first line of error, sanitized
-                error_line = str(e.smtp_error).split('\n')[0][:100]
-                error_msg += f": {error_line}"
+            if isinstance(e, aiosmtplib.SMTPResponseException):
+                error_msg += f" (code {e.code})"
+                if e.message:
+                    # Only include first line of error, sanitized
+                    error_line = str(e.message).split('\n')[0][:100]
+                    error_msg += f": {error_line}"
             last_error = error_msg
+            if isinstance(e, aiosmtplib.SMTPAuthenticationError):
+                last_error_type = "auth"
+            elif isinstance(e, aiosmtplib.SMTPTimeoutError):
+                last_error_type = "timeout"
+            elif isinstance(e, (aiosmtplib.SMTPConnectError, aiosmtplib.SMTPServerDisconnected)):
+                last_error_type = "connection"
+            else:
+                last_error_type = "api_error"
             logger.error("SMTP error sending email to %s (attempt %d/%d): %s", to_email, attempt, max_attempts, e)
+            # Bad credentials / rejected sender won't succeed on retry, and repeated
+            # logins can trigger provider lockouts
+            if isinstance(e, (aiosmtplib.SMTPAuthenticationError, aiosmtplib.SMTPSenderRefused)):
+                break
         except (ConnectionError, TimeoutError, OSError) as e:
             error_msg = f"Connection error: {type(e).__name__}"
             if str(e):
                 error_msg += f": {str(e)[:100]}"
             last_error = error_msg
+            last_error_type = "timeout" if isinstance(e, TimeoutError) else "connection"
             logger.error("Connection error sending email to %s (attempt %d/%d): %s", to_email, attempt, max_attempts, e)
         except Exception as e:
             error_msg = f"Unexpected error: {type(e).__name__}"
             last_error = error_msg
-            logger.error("Unexpected error sending email to %s (attempt %d/%d): %s", to_email, attempt, max_attempts, e, exc_info=True)
+            last_error_type = "unknown"
+            # Traceback only in DEBUG and on the first attempt; retries repeat the same failure
+            logger.error("Unexpected error sending email to %s (attempt %d/%d): %s: %s",
+                         to_email, attempt, max_attempts, type(e).__name__, e, exc_info=DEBUG and attempt == 1)
         
-        # If not the last attempt, wait before retrying
+        # If not the last attempt, wait before retrying (exponential backoff with jitter)
         if attempt < max_attempts:
-            logger.info("Retrying SMTP send to %s in 2 seconds (attempt %d/%d)", to_email, attempt + 1, max_attempts)
-            await asyncio.sleep(2)
+            delay = min(SMTP_BACKOFF_CAP, SMTP_BACKOFF_BASE * (SMTP_BACKOFF_MULT ** (attempt - 1))) * random.uniform(0.5, 1.5)
+            logger.info("Retrying SMTP send to %s in %.1f seconds (attempt %d/%d)", to_email, delay, attempt + 1, max_attempts)
+            await asyncio.sleep(delay)
     
     # All attempts failed - return the last error message
-    logger.error("SMTP send failed to %s after %d attempts: %s", to_email, max_attempts, last_error)
-    return (False, last_error or "Failed to send email after multiple attempts")
+    logger.error("SMTP send failed to %s after %d attempts: %s", to_email, attempt, last_error)
+    return (False, last_error or "Failed to send email after multiple attempts", last_error_type)
+
+
+def request_is_https(request: Request) -> bool:
+    """HTTPS as seen by the client: direct TLS, a proxy's X-Forwarded-Proto, or production."""
+    return (
+        IS_PRODUCTION
+        or request.url.scheme == "https"
+        or request.headers.get("X-Forwarded-Proto", "").lower() == "https"
+    )
 
 
 def get_public_base_url(request: Request) -> str:
@@ -2258,18 +2934,32 @@ def get_public_base_url(request: Request) -> str:
     Falls back to request.base_url if PUBLIC_BASE_URL is not set.
     Ensures proper URL formatting (no double slashes, proper scheme).
     """
-    base_url = get_env("PUBLIC_BASE_URL")
-    if base_url:
-        # Use env var, ensure it's properly formatted
-        base_url = base_url.rstrip('/')
-    else:
-        # Fallback to request.base_url (check X-Forwarded-Proto for Railway/proxy)
-        base_url = str(request.base_url).rstrip('/')
-        # Check X-Forwarded-Proto header for HTTPS behind proxy
-        forwarded_proto = request.headers.get("X-Forwarded-Proto", "").lower()
-        if forwarded_proto == "https" and base_url.startswith("http://"):
-            base_url = base_url.replace("http://", "https://", 1)
+    configured = _configured_public_base_url()
+    if configured:
+        return configured
     
+    # Fallback to request.base_url (check X-Forwarded-Proto for Railway/proxy)
+    return _request_base_url(str(request.base_url), request.headers.get("X-Forwarded-Proto", ""))
+
+
+@functools.lru_cache(maxsize=32)
+def _request_base_url(request_base_url: str, forwarded_proto: str) -> str:
+    """Normalized base URL for a request; only a handful of host/proto pairs occur."""
+    base_url = request_base_url.rstrip('/')
+    # Check X-Forwarded-Proto header for HTTPS behind proxy
+    if forwarded_proto.lower() == "https" and base_url.startswith("http://"):
+        base_url = base_url.replace("http://", "https://", 1)
+    return _normalize_base_url(base_url)
+
+
+@functools.lru_cache(maxsize=1)
+def _configured_public_base_url() -> Optional[str]:
+    """Normalized PUBLIC_BASE_URL (env is constant, so computed once)."""
+    base_url = get_env("PUBLIC_BASE_URL")
+    return _normalize_base_url(base_url.rstrip('/')) if base_url else None
+
+
+def _normalize_base_url(base_url: str) -> str:
     # Ensure no double slashes (except after scheme)
     if '://' in base_url:
         scheme, rest = base_url.split('://', 1)
@@ -2287,16 +2977,194 @@ def get_public_base_url(request: Request) -> str:
 
 # Authentication endpoints
 @app.get("/auth/send-magic-link")
-async def send_magic_link_get() -> JSONResponse:
+async def send_magic_link_get() -> ORJSONResponse:
     """GET handler for send-magic-link - returns friendly message instead of Method Not Allowed."""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=200,
         content={"ok": False, "detail": "Use POST with JSON body {email: ...} or FormData with email field"}
     )
 
 
+async def _issue_magic_link_payload(email: str, base_url: str) -> Tuple[int, bytes]:
+    """_issue_magic_link as (status_code, body) so coalesced callers can share it."""
+    response = await _issue_magic_link(email, base_url)
+    return response.status_code, bytes(response.body)
+
+
+def _inflight_magic_link_done(key: Tuple[str, str], task: "asyncio.Task[Tuple[int, bytes]]") -> None:
+    if _inflight_magic_links.get(key) is task:
+        del _inflight_magic_links[key]
+    # Retrieve the outcome so a send whose callers all disconnected is not
+    # reported as "Task exception was never retrieved"
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Magic-link send failed: %s", task.exception())
+
+
+async def _issue_magic_link(email: str, base_url: str) -> ORJSONResponse:
+    """Create a magic token for email and deliver it via Resend and/or SMTP."""
+    email_config = get_email_config()
+    
+    # Upsert the user and create the magic token (always, even if sending fails)
+    # concurrently: the token only needs the email, not the user row. Kept
+    # inline even in background mode so a DB failure is reported as a 500.
+    _, token = await asyncio.gather(
+        db.get_or_create_user(email),
+        db.create_magic_token(email),
+    )
+    
+    magic_link = f"{base_url}/auth/verify?token={token}"
+    
+    # Store magic link in memory for dev mode /debug/last-magic-link endpoint
+    if DEBUG or ENV == "dev":
+        global _last_magic_link
+        _last_magic_link = magic_link
+    
+    if MAGIC_LINK_BACKGROUND_SEND and (email_config["resend_configured"] or email_config["smtp_configured"]):
+        task = asyncio.create_task(_deliver_magic_link(email, magic_link))
+        _background_email_tasks.add(task)
+        task.add_done_callback(_background_email_done)
+        logger.info("POST /auth/send-magic-link: queued background send email=%s", email)
+        return ORJSONResponse(status_code=202, content={
+            "ok": True,
+            "success": True,
+            "message": "Magic link sent to your email."
+        })
+    return await _deliver_magic_link(email, magic_link)
+
+
+def _background_email_done(task: "asyncio.Task[ORJSONResponse]") -> None:
+    _background_email_tasks.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.error("Background magic-link send crashed: %s", task.exception(),
+                     exc_info=task.exception())
+        return
+    # The client already got a 202, so a failed delivery only shows up here
+    response = task.result()
+    if response.status_code >= 400:
+        logger.error("Background magic-link send failed: status=%d body=%s",
+                     response.status_code, response.body.decode(errors="replace"))
+
+
+async def _deliver_magic_link(email: str, magic_link: str) -> ORJSONResponse:
+    """Send the magic-link email via Resend and/or SMTP; the response reports the outcome."""
+    email_config = get_email_config()
+    resend_configured = email_config["resend_configured"]
+    smtp_configured = email_config["smtp_configured"]
+    from_raw = email_config["from_raw"]
+    from_email = email_config["from_email"]
+    smtp_config = email_config["smtp_config"]
+
+    # Prepare email content
+    email_subject = "Sign in to FormFillAI"
+    email_body = MAGIC_LINK_EMAIL_HTML.format(link=magic_link)
+    
+    # Try Resend API first (primary method)
+    email_sent = False
+    error_msg = None
+    method_used = "none"
+    hedged = EMAIL_HEDGE and resend_configured and smtp_configured
+    
+    if hedged:
+        # Race Resend against SMTP once Resend is slow (duplicate links are harmless)
+        email_sent, error_msg, error_type, method_used = await send_email_hedged(
+            to_email=email,
+            subject=email_subject,
+            html=email_body,
+            from_email=from_email,
+            from_raw=from_raw,
+            smtp_config=smtp_config
+        )
+        if email_sent:
+            logger.info("POST /auth/send-magic-link: method=%s (hedged) success email=%s", method_used, email)
+            return ORJSONResponse({
+                "ok": True,
+                "success": True,
+                "message": "Magic link sent to your email."
+            })
+        logger.warning("POST /auth/send-magic-link: hedged send failed email=%s error_type=%s", email, error_type)
+    elif resend_configured:
+        method_used = "resend_api"
+        email_sent, error_msg, error_type = await send_email_via_resend_api(
+            to_email=email,
+            subject=email_subject,
+            html=email_body,
+            from_email=from_email,
+            from_raw=from_raw
+        )
+        if email_sent:
+            logger.info("POST /auth/send-magic-link: method=resend_api success email=%s", email)
+            return ORJSONResponse({
+                "ok": True,
+                "success": True,
+                "message": "Magic link sent to your email."
+            })
+        else:
+            logger.warning("POST /auth/send-magic-link: method=resend_api failed email=%s error_type=%s", email, error_type)
+            # Fall through to SMTP fallback
+    
+    # Fallback to SMTP if Resend failed or not configured (the hedged path already tried it)
+    if not email_sent and smtp_configured and not hedged:
+        method_used = "smtp"
+        email_sent, error_msg, error_type = await send_email_via_smtp(
+            to_email=email,
+            subject=email_subject,
+            body=email_body,
+            smtp_config=smtp_config
+        )
+        if email_sent:
+            logger.info("POST /auth/send-magic-link: method=smtp success email=%s", email)
+            return ORJSONResponse({
+                "ok": True,
+                "success": True,
+                "message": "Magic link sent to your email."
+            })
+        else:
+            logger.warning("POST /auth/send-magic-link: method=smtp failed email=%s error_type=%s", email, error_type)
+    
+    # Both methods failed or not configured
+    # Always log full magic link when email send fails (for Railway logs debugging)
+    logger.info("MAGIC_LINK: %s", magic_link)
+    
+    # Store token for debug endpoint (when sending fails)
+    # The token is already in the database, so we just need to ensure it's accessible
+    
+    if not resend_configured and not smtp_configured:
+        # No email service configured
+        logger.warning("POST /auth/send-magic-link: method=none email=%s reason=not_configured", email)
+        return ORJSONResponse(
+            status_code=503,
+            content={"ok": False, "detail": "Email service is not configured. Please configure RESEND_API_KEY or SMTP settings."}
+        )
+    else:
+        # Email service configured but sending failed
+        safe_error = error_msg[:200] if error_msg else "Failed to send email"
+        logger.error("POST /auth/send-magic-link: method=%s failed email=%s detail=%s", method_used, email, safe_error)
+        return ORJSONResponse(
+            status_code=503,
+            content={"ok": False, "detail": safe_error}
+        )
+
+
+# Auth forms carry a single short field (email or token) and never files
+AUTH_FORM_MAX_FIELDS = 8
+
+
+async def read_auth_form(request: Request) -> FormData:
+    """Parse a small auth form; too many fields or any file part is a 400."""
+    try:
+        form_data = await request.form(max_files=0, max_fields=AUTH_FORM_MAX_FIELDS)
+    except StarletteHTTPException as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    # Starlette only enforces max_fields for multipart; apply it to urlencoded too
+    if len(form_data.multi_items()) > AUTH_FORM_MAX_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Too many fields. Maximum number of fields is {AUTH_FORM_MAX_FIELDS}.")
+    return form_data
+
+
 @app.post("/auth/send-magic-link")
-async def send_magic_link(request: Request) -> JSONResponse:
+async def send_magic_link(request: Request) -> Response:
     """Send magic link email for authentication.
     
     Accepts either JSON body with {"email": "..."} or FormData with email field.
@@ -2305,7 +3173,7 @@ async def send_magic_link(request: Request) -> JSONResponse:
         # Check database availability
         if not db.is_db_available():
             logger.error("Database not available for magic link creation")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=503,
                 content={"detail": "Database temporarily unavailable. Please try again later."}
             )
@@ -2320,139 +3188,44 @@ async def send_magic_link(request: Request) -> JSONResponse:
                 raise HTTPException(status_code=400, detail="Invalid JSON body. Expected {email: ...}")
         else:
             # FormData
-            form_data = await request.form()
-            email = form_data.get("email", "").strip()
+            form_data = await read_auth_form(request)
+            email = str(form_data.get("email", "")).strip()
         
         # Get unified email configuration
         email_config = get_email_config()
-        resend_configured = email_config["resend_configured"]
-        smtp_configured = email_config["smtp_configured"]
-        from_raw = email_config["from_raw"]
-        from_email = email_config["from_email"]
-        smtp_config = email_config["smtp_config"]
         
         # Log email configuration (unambiguous, no secrets)
         logger.info("Email config: resend_configured=%s smtp_configured=%s from_present=%s",
-                    resend_configured, smtp_configured, bool(from_email))
+                    email_config["resend_configured"], email_config["smtp_configured"],
+                    bool(email_config["from_email"]))
         
         # Validate email format
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not email or not re.match(email_pattern, email):
+        if not email or not EMAIL_RE.match(email):
             raise HTTPException(status_code=400, detail="Invalid email address.")
         
-        # Create or get user
-        user = await db.get_user_by_email(email)
-        if not user:
-            user_id = await db.create_user(email)
-        else:
-            user_id = user["id"]
-        
-        # Create magic token (always generate, even if SMTP fails)
-        token = await db.create_magic_token(email)
-        
-        # Build magic link URL using PUBLIC_BASE_URL if available
+        # Coalesce concurrent sends for the same address and link base URL (double
+        # clicks): requests arriving while a send is in flight share its result.
+        # The base URL comes from PUBLIC_BASE_URL if available.
         base_url = get_public_base_url(request)
-        magic_link = f"{base_url}/auth/verify?token={token}"
-        
-        # Store magic link in memory for dev mode /debug/last-magic-link endpoint
-        if DEBUG or ENV == "dev":
-            global _last_magic_link
-            _last_magic_link = magic_link
-        
-        # Prepare email content
-        email_subject = "Sign in to FormFillAI"
-        email_body = f"""<html><body><p>Click the link below to sign in to your FormFillAI account:</p><p><a href="{magic_link}">{magic_link}</a></p><p>This link will expire in 15 minutes.</p><p>If you didn't request this link, you can safely ignore this email.</p></body></html>"""
-        
-        # Try Resend API first (primary method)
-        email_sent = False
-        error_msg = None
-        method_used = "none"
-        
-        if resend_configured:
-            method_used = "resend_api"
-            email_sent, error_msg = await send_email_via_resend_api(
-                to_email=email,
-                subject=email_subject,
-                html=email_body,
-                from_email=from_email,
-                from_raw=from_raw
-            )
-            if email_sent:
-                logger.info("POST /auth/send-magic-link: method=resend_api success email=%s", email)
-                return JSONResponse({
-                    "ok": True,
-                    "success": True,
-                    "message": "Magic link sent to your email."
-                })
-            else:
-                # Extract safe error type
-                error_type = "unknown"
-                if error_msg:
-                    if "timeout" in error_msg.lower():
-                        error_type = "timeout"
-                    elif "status" in error_msg.lower():
-                        error_type = "api_error"
-                    else:
-                        error_type = "connection_error"
-                logger.warning("POST /auth/send-magic-link: method=resend_api failed email=%s error_type=%s", email, error_type)
-                # Fall through to SMTP fallback
-        
-        # Fallback to SMTP if Resend failed or not configured
-        if not email_sent and smtp_configured:
-            method_used = "smtp"
-            email_sent, error_msg = await send_email_via_smtp(
-                to_email=email,
-                subject=email_subject,
-                body=email_body,
-                smtp_config=smtp_config
-            )
-            if email_sent:
-                logger.info("POST /auth/send-magic-link: method=smtp success email=%s", email)
-                return JSONResponse({
-                    "ok": True,
-                    "success": True,
-                    "message": "Magic link sent to your email."
-                })
-            else:
-                # Extract safe error type
-                error_type = "unknown"
-                if error_msg:
-                    if "timeout" in error_msg.lower() or "timed out" in error_msg.lower():
-                        error_type = "timeout"
-                    elif "connection" in error_msg.lower():
-                        error_type = "connection_error"
-                    else:
-                        error_type = "smtp_error"
-                logger.warning("POST /auth/send-magic-link: method=smtp failed email=%s error_type=%s", email, error_type)
-        
-        # Both methods failed or not configured
-        # Always log full magic link when email send fails (for Railway logs debugging)
-        logger.info("MAGIC_LINK: %s", magic_link)
-        
-        # Store token for debug endpoint (when sending fails)
-        # The token is already in the database, so we just need to ensure it's accessible
-        
-        if not resend_configured and not smtp_configured:
-            # No email service configured
-            logger.warning("POST /auth/send-magic-link: method=none email=%s reason=not_configured", email)
-            return JSONResponse(
-                status_code=503,
-                content={"ok": False, "detail": "Email service is not configured. Please configure RESEND_API_KEY or SMTP settings."}
-            )
+        key = (email.lower(), base_url)
+        task = _inflight_magic_links.get(key)
+        # A finished send can stay registered until its done-callback runs
+        if task is None or task.done():
+            task = asyncio.create_task(_issue_magic_link_payload(email, base_url))
+            _inflight_magic_links[key] = task
+            task.add_done_callback(functools.partial(_inflight_magic_link_done, key))
         else:
-            # Email service configured but sending failed
-            safe_error = error_msg[:200] if error_msg else "Failed to send email"
-            logger.error("POST /auth/send-magic-link: method=%s failed email=%s detail=%s", method_used, email, safe_error)
-            return JSONResponse(
-                status_code=503,
-                content={"ok": False, "detail": safe_error}
-            )
+            logger.info("POST /auth/send-magic-link: coalesced with in-flight send email=%s", email)
+        # Shield so one client disconnecting does not cancel the shared send
+        status_code, body = await asyncio.shield(task)
+        return Response(content=body, status_code=status_code, media_type="application/json")
     except HTTPException:
         # Re-raise HTTP exceptions (400, etc.)
         raise
     except Exception as e:
         # Catch any unexpected errors and return 500 with generic message
-        logger.error("Unexpected error in send_magic_link: %s", e, exc_info=True)
+        # Type and message are enough in production; full traceback in DEBUG
+        logger.error("Unexpected error in send_magic_link: %s: %s", type(e).__name__, e, exc_info=DEBUG)
         raise HTTPException(
             status_code=500,
             detail="An unexpected error occurred. Please try again later."
@@ -2477,7 +3250,7 @@ async def _verify_token_and_create_session(request: Request, token: str) -> tupl
     # Verify token (this marks it as used atomically)
     email = await db.verify_magic_token(token)
     if not email:
-        db_backend = db.get_db_backend_name()
+        db_backend = DB_BACKEND_NAME
         logger.warning("Token verification failed: token_prefix=%s reason=invalid/expired/used backend=%s", 
                        token_prefix, db_backend)
         return (None, None, None, "Invalid or expired token")
@@ -2485,17 +3258,12 @@ async def _verify_token_and_create_session(request: Request, token: str) -> tupl
     logger.info("Token verified successfully: token_prefix=%s email=%s", 
                 token_prefix, email)
     
-    # Get or create user
-    user = await db.get_user_by_email(email)
-    if not user:
-        user_id = await db.create_user(email)
-        logger.info("Created new user for email: %s", email)
-    else:
-        user_id = user["id"]
+    # Get or create user (single upsert)
+    user_id = await db.get_or_create_user(email)
     
     # Create session (uses active backend - postgres or sqlite)
     session_id = await db.create_session(user_id)
-    db_backend = db.get_db_backend_name()
+    db_backend = DB_BACKEND_NAME
     logger.info("Session created: user_id=%s session_id_prefix=%s backend=%s", 
                 user_id, session_id[:8] if len(session_id) >= 8 else "short", db_backend)
     
@@ -2519,8 +3287,8 @@ async def verify_magic_link_post(request: Request) -> JSONResponse:
             raise HTTPException(status_code=400, detail="Invalid JSON body. Expected {token: ...}")
     else:
         # FormData
-        form_data = await request.form()
-        token = form_data.get("token", "").strip()
+        form_data = await read_auth_form(request)
+        token = str(form_data.get("token", "")).strip()
     
     if not token:
         raise HTTPException(status_code=400, detail="Token is required")
@@ -2563,7 +3331,7 @@ async def verify_magic_link_post(request: Request) -> JSONResponse:
         secure=is_https,
         samesite="lax",
         path="/",
-        max_age=60 * 60 * 24 * 30,  # 30 days
+        max_age=SESSION_COOKIE_MAX_AGE,
         # Do NOT set domain explicitly - let browser use current host
     )
     
@@ -2588,11 +3356,10 @@ async def verify_magic_link(request: Request, token: Optional[str] = None) -> Re
         logger.warning("GET /auth/verify: token missing in query params")
         return RedirectResponse(url="/?auth_error=missing_token", status_code=303)
     
-    # Log backend consistency
-    db_backend = db.get_db_backend_name()
-    database_url_set = bool(os.getenv("DATABASE_URL"))
-    logger.info("GET /auth/verify: backend=%s DATABASE_URL=%s ENV=%s DEBUG=%s IS_PRODUCTION=%s",
-                db_backend, database_url_set, ENV or "not set", DEBUG, IS_PRODUCTION)
+    log_info = logger.isEnabledFor(logging.INFO)
+    if log_info:
+        logger.info("GET /auth/verify: backend=%s DATABASE_URL=%s ENV=%s DEBUG=%s IS_PRODUCTION=%s",
+                    DB_BACKEND_NAME, DATABASE_URL_SET, ENV or "not set", DEBUG, IS_PRODUCTION)
     
     # Verify token and create session
     email, session_id, user_id, error_msg = await _verify_token_and_create_session(request, token)
@@ -2603,27 +3370,20 @@ async def verify_magic_link(request: Request, token: Optional[str] = None) -> Re
         else:
             return RedirectResponse(url="/?auth_error=invalid_token", status_code=303)
     
-    # Determine if request is HTTPS (check X-Forwarded-Proto for Railway/proxy)
-    scheme = request.url.scheme
-    x_forwarded_proto = request.headers.get("X-Forwarded-Proto", "").lower()
-    host = request.headers.get("host", "unknown")
-    
     # Secure flag MUST work behind Railway: X-Forwarded-Proto == "https" OR IS_PRODUCTION
-    # In production, default secure=True even if header missing
-    is_https = (x_forwarded_proto == "https") or (scheme == "https") or IS_PRODUCTION
-    
-    # Build redirect URL - use relative redirect
+    is_https = request_is_https(request)
     redirect_url = "/?auth_success=1"
     
-    # Log verification details (no secrets)
-    session_id_prefix = session_id[:8] if len(session_id) >= 8 else "short"
-    token_prefix = token[:6] if len(token) >= 6 else "none"
-    logger.info("GET /auth/verify: token_prefix=%s user_id=%s session_id_prefix=%s secure=%s scheme=%s x_forwarded_proto=%s host=%s redirect_url=%s",
-                token_prefix, user_id, session_id_prefix, is_https, scheme, x_forwarded_proto, host, redirect_url)
+    if log_info:
+        # Verification details (no secrets)
+        logger.info("GET /auth/verify: token_prefix=%s user_id=%s session_id_prefix=%s secure=%s scheme=%s x_forwarded_proto=%s host=%s redirect_url=%s max_age=%d",
+                    token[:6] if len(token) >= 6 else "none", user_id,
+                    session_id[:8] if len(session_id) >= 8 else "short", is_https, request.url.scheme,
+                    request.headers.get("X-Forwarded-Proto", ""), request.headers.get("host", "unknown"),
+                    redirect_url, SESSION_COOKIE_MAX_AGE)
     
-    # Create a single RedirectResponse object and set cookie on it
-    # This ensures the cookie is set on the response that's actually returned
     response = RedirectResponse(url=redirect_url, status_code=303)
+    # Do NOT set domain explicitly - let browser use current host
     response.set_cookie(
         key="session",
         value=session_id,
@@ -2631,98 +3391,71 @@ async def verify_magic_link(request: Request, token: Optional[str] = None) -> Re
         secure=is_https,  # Secure only when HTTPS detected
         samesite="lax",
         path="/",
-        max_age=60 * 60 * 24 * 30,  # 30 days
-        # Do NOT set domain explicitly - let browser use current host
+        max_age=SESSION_COOKIE_MAX_AGE,
     )
-    
-    # Log cookie setting (no secrets, only metadata)
-    # Verify Set-Cookie header is actually on the response object we're returning
-    set_cookie_header = response.headers.get("set-cookie", "")
-    set_cookie_header_present = "session" in str(set_cookie_header)
-    max_age_days = 30
-    max_age_seconds = max_age_days * 24 * 3600
-    logger.info("verify: set-cookie issued name=session secure=%s samesite=lax path=/ max_age=%d token_prefix=%s user_id=%s session_id_prefix=%s scheme=%s x_forwarded_proto=%s host=%s",
-                is_https, max_age_seconds, token_prefix, user_id, session_id_prefix, scheme, x_forwarded_proto, host)
-    
-    # Double-check: ensure cookie is actually set before returning
-    if not set_cookie_header_present:
-        logger.error("CRITICAL: Set-Cookie header NOT found on RedirectResponse! Cookie will not be sent to client.")
-    
     return response
 
 
 @app.post("/auth/logout")
-async def logout(request: Request) -> JSONResponse:
+async def logout(request: Request) -> ORJSONResponse:
     """Logout user by deleting session."""
     session_id = request.cookies.get("session")
     if session_id:
         await db.delete_session(session_id)
     
-    # Determine secure flag (same logic as /auth/verify)
-    scheme = request.url.scheme
-    x_forwarded_proto = request.headers.get("X-Forwarded-Proto", "").lower()
-    is_https = (x_forwarded_proto == "https") or (scheme == "https") or IS_PRODUCTION
-    
-    response = JSONResponse({"success": True})
-    response.delete_cookie("session", httponly=True, secure=is_https, samesite="lax", path="/")
+    response = ORJSONResponse({"success": True})
+    # Same secure flag as /auth/verify so the browser matches the cookie
+    response.delete_cookie("session", httponly=True, secure=request_is_https(request), samesite="lax", path="/")
     return response
 
 
 # Profile endpoints
 @app.get("/api/profiles")
-async def list_profiles(user: Dict[str, Any] = Depends(require_user)) -> JSONResponse:
+async def list_profiles(user: Dict[str, Any] = Depends(require_user)) -> ORJSONResponse:
     """List all profiles for current user."""
     profiles = await db.get_user_profiles(user["id"])
-    return JSONResponse({"profiles": profiles})
+    return ORJSONResponse({"profiles": profiles})
 
 
 @app.post("/api/profiles")
 async def create_profile(
-    request: Request,
     name: str = Form(...),
     data: str = Form(...),
     user: Dict[str, Any] = Depends(require_user),
-) -> JSONResponse:
+    is_pro: bool = Depends(get_is_pro),
+) -> ORJSONResponse:
     """Create a new profile (paid-only)."""
-    # Check if user is Pro
-    is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
     if not is_pro and not user.get("is_pro"):
         raise HTTPException(
             status_code=403,
             detail="Saving profiles requires a Pro subscription. Please upgrade."
         )
     
-    try:
-        profile_data = json.loads(data)
-        if not isinstance(profile_data, dict):
-            raise ValueError("Data must be a JSON object")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON data.")
+    profile_data = parse_json_form(data, dict, "Invalid JSON data.")
     
     profile_id = await db.create_profile(user["id"], name, profile_data)
-    return JSONResponse({"success": True, "profile_id": profile_id})
+    return ORJSONResponse({"success": True, "profile_id": profile_id})
 
 
 @app.get("/api/profiles/{profile_id}")
-async def get_profile(profile_id: str, user: Dict[str, Any] = Depends(require_user)) -> JSONResponse:
+async def get_profile(profile_id: str, user: Dict[str, Any] = Depends(require_user)) -> ORJSONResponse:
     """Get a specific profile."""
     profile = await db.get_profile(profile_id, user["id"])
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found.")
     
-    return JSONResponse(profile)
+    return ORJSONResponse(profile)
 
 
 @app.put("/api/profiles/{profile_id}")
 async def update_profile_endpoint(
-    request: Request,
     profile_id: str,
     name: Optional[str] = Form(None),
     data: Optional[str] = Form(None),
     user: Dict[str, Any] = Depends(require_user),
-) -> JSONResponse:
+    is_pro: bool = Depends(get_is_pro),
+) -> ORJSONResponse:
     """Update a profile (paid-only)."""
-    is_pro = get_pro_entitlement_active(request.cookies.get("ffai_pro")) is not None
     if not is_pro and not user.get("is_pro"):
         raise HTTPException(
             status_code=403,
@@ -2731,31 +3464,26 @@ async def update_profile_endpoint(
     
     profile_data = None
     if data:
-        try:
-            profile_data = json.loads(data)
-            if not isinstance(profile_data, dict):
-                raise ValueError("Data must be a JSON object")
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON data.")
+        profile_data = parse_json_form(data, dict, "Invalid JSON data.")
     
     success = await db.update_profile(profile_id, user["id"], name, profile_data)
     if not success:
         raise HTTPException(status_code=404, detail="Profile not found.")
     
-    return JSONResponse({"success": True})
+    return ORJSONResponse({"success": True})
 
 
 @app.delete("/api/profiles/{profile_id}")
 async def delete_profile_endpoint(
     profile_id: str,
     user: Dict[str, Any] = Depends(require_user),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Delete a profile."""
     success = await db.delete_profile(profile_id, user["id"])
     if not success:
         raise HTTPException(status_code=404, detail="Profile not found.")
     
-    return JSONResponse({"success": True})
+    return ORJSONResponse({"success": True})
 
 
 @app.post("/api/profiles/apply")
@@ -2765,19 +3493,14 @@ async def apply_profile(
     pdf_hash: Optional[str] = Form(None),
     fields_json: str = Form(...),
     user: Dict[str, Any] = Depends(require_user),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Apply a profile to PDF fields using mapping."""
     
     profile = await db.get_profile(profile_id, user["id"])
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found.")
     
-    try:
-        fields = json.loads(fields_json)
-        if not isinstance(fields, list):
-            raise ValueError("fields_json must be a list")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid fields_json format.")
+    fields = parse_json_form(fields_json, list, "Invalid fields_json format.")
     
     pdf_field_names = [f.get("name", "") for f in fields if isinstance(f, dict) and f.get("name")]
     
@@ -2788,12 +3511,14 @@ async def apply_profile(
     
     # Map canonical fields to PDF fields
     if mappings:
-        # Use cached mappings
-        mapped_data = {}
-        for pdf_field, canonical_key in mappings.items():
-            if canonical_key in profile["data"] and pdf_field in pdf_field_names:
-                mapped_data[pdf_field] = profile["data"][canonical_key]
-        result = mapped_data
+        # Use cached mappings (set lookup instead of scanning the field list)
+        pdf_field_set = set(pdf_field_names)
+        profile_data = profile["data"]
+        result = {
+            pdf_field: profile_data[canonical_key]
+            for pdf_field, canonical_key in mappings.items()
+            if pdf_field in pdf_field_set and canonical_key in profile_data
+        }
     else:
         # Use automatic mapping
         result = db.map_canonical_to_pdf_fields(profile["data"], pdf_field_names)
@@ -2803,40 +3528,51 @@ async def apply_profile(
             reverse_mappings = {v: k for k, v in result.items()}
             await db.save_pdf_mapping(user["id"], pdf_hash, reverse_mappings)
     
-    return JSONResponse({"mapped_data": result})
+    return ORJSONResponse({"mapped_data": result})
 
 
 @app.post("/api/user/delete-data")
 async def delete_user_data(
     request: Request,
     user: Dict[str, Any] = Depends(require_user),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """Delete all user data (profiles, mappings, etc)."""
     await db.delete_user_data(user["id"])
     
-    response = JSONResponse({"success": True, "message": "All data deleted."})
+    response = ORJSONResponse({"success": True, "message": "All data deleted."})
     response.delete_cookie("session_id", httponly=True, secure=IS_PRODUCTION, samesite="lax")
     return response
 
 
+# A successful DB probe is reused for this long; load balancers poll /health every few seconds
+HEALTH_DB_CHECK_TTL_SECONDS = 5.0
+_health_db_ok_at = float("-inf")
+
+
 @app.get("/health")
-async def health() -> Dict[str, Any]:
+async def health() -> ORJSONResponse:
     """Health check endpoint with database connectivity status."""
+    global _health_db_ok_at
     db_available = db.is_db_available()
     db_connected = False
-    db_backend = db.get_db_backend_name() or "unknown"
+    db_backend = DB_BACKEND_NAME
     
     if db_available:
-        try:
-            db_connected = await db.check_db_connectivity()
-        except Exception as e:
-            logger.warning("Health check DB connectivity error: %s", e)
+        if time.monotonic() - _health_db_ok_at < HEALTH_DB_CHECK_TTL_SECONDS:
+            db_connected = True
+        else:
+            try:
+                db_connected = await db.check_db_connectivity()
+            except Exception as e:
+                logger.warning("Health check DB connectivity error: %s", e)
+            if db_connected:
+                _health_db_ok_at = time.monotonic()
     
     # In production, verify Postgres is being used
     if IS_PRODUCTION and db_backend != "postgres":
         logger.error("Health check: Production requires Postgres but backend is %s", db_backend)
     
-    return {
+    return ORJSONResponse({
         "ok": True,
         "status": "ok",
         "database": {
@@ -2844,31 +3580,22 @@ async def health() -> Dict[str, Any]:
             "connected": db_connected,
             "backend": db_backend
         }
-    }
+    })
 
 
-@app.get("/debug/email")
-async def debug_email(request: Request) -> JSONResponse:
-    """Debug endpoint for email configuration (production-safe).
-    
-    Returns Resend API and SMTP configuration status, PUBLIC_BASE_URL, and environment info.
-    Does NOT leak secrets - only shows booleans and parsed port.
-    """
+@functools.lru_cache(maxsize=1)
+def _debug_email_body() -> bytes:
+    """Serialized /debug/email payload; every field is fixed once the process starts."""
     # Get unified email config
     email_config = get_email_config()
     
-    # Check if FROM is in angle bracket format (e.g., "Name <email@domain.com>")
-    from_is_angle_format = False
-    if email_config["from_raw"] and "<" in email_config["from_raw"] and ">" in email_config["from_raw"]:
-        from_is_angle_format = True
-    
     # Get PUBLIC_BASE_URL
     public_base_url_value = get_env("PUBLIC_BASE_URL")
     public_base_url_present = bool(public_base_url_value)
     
     smtp_config = email_config["smtp_config"]
     
-    return JSONResponse({
+    return orjson.dumps({
         "resend": {
             "present": email_config["resend_configured"]
         },
@@ -2882,7 +3609,7 @@ async def debug_email(request: Request) -> JSONResponse:
             "missing_keys": smtp_config["missing_keys"]
         },
         "from": {
-            "is_angle_format": from_is_angle_format,
+            "is_angle_format": email_config["from_is_angle_format"],
             "present": bool(email_config["from_email"])
         },
         "public_base_url_present": public_base_url_present,
@@ -2895,8 +3622,25 @@ async def debug_email(request: Request) -> JSONResponse:
     })
 
 
+@app.get("/debug/email")
+async def debug_email(request: Request) -> Response:
+    """Debug endpoint for email configuration (production-safe).
+    
+    Returns Resend API and SMTP configuration status, PUBLIC_BASE_URL, and environment info.
+    Does NOT leak secrets - only shows booleans and parsed port.
+    In production, requires X-Debug-Key matching DEBUG_KEY (404 if DEBUG_KEY is unset).
+    """
+    if IS_PRODUCTION:
+        if not DEBUG_KEY_BYTES:
+            raise HTTPException(status_code=404, detail="Not found")
+        provided_key = request.headers.get("X-Debug-Key", "")
+        if not hmac.compare_digest(provided_key.encode(), DEBUG_KEY_BYTES):
+            raise HTTPException(status_code=403, detail="Invalid debug key")
+    return Response(content=_debug_email_body(), media_type="application/json")
+
+
 @app.get("/debug/last-magic-link")
-async def debug_last_magic_link(request: Request, email: Optional[str] = None) -> JSONResponse:
+async def debug_last_magic_link(request: Request, email: Optional[str] = None) -> Response:
     """Secure debug endpoint to get last generated magic link for an email.
     
     Enabled when DEBUG=1 OR when X-Debug-Key header matches DEBUG_KEY environment variable.
@@ -2910,136 +3654,74 @@ async def debug_last_magic_link(request: Request, email: Optional[str] = None) -
     """
     # In production, require DEBUG_KEY to be set and match header
     # In dev (DEBUG=1), allow without header
-    debug_key = get_env("DEBUG_KEY")
-    
     # Require DEBUG_KEY env var (required in production)
-    if not debug_key:
+    if not DEBUG_KEY_BYTES:
         raise HTTPException(status_code=404, detail="Not found")
     
-    # Require X-Debug-Key header to match DEBUG_KEY
+    # Require X-Debug-Key header to match DEBUG_KEY (constant-time comparison)
     provided_key = request.headers.get("X-Debug-Key", "")
-    if not provided_key or provided_key != debug_key:
+    if not hmac.compare_digest(provided_key.encode(), DEBUG_KEY_BYTES):
         raise HTTPException(status_code=403, detail="Invalid debug key")
     
     # Email is required
     if not email:
-        return JSONResponse(
-            status_code=400,
-            content={"ok": False, "detail": "Email parameter is required"}
-        )
+        return make_json_response({"ok": False, "detail": "Email parameter is required"}, status_code=400)
     
     email = email.strip().lower()
     if not email:
-        return JSONResponse(
-            status_code=400,
-            content={"ok": False, "detail": "Email parameter is required"}
-        )
+        return make_json_response({"ok": False, "detail": "Email parameter is required"}, status_code=400)
     
-    # Get latest unexpired token from database
-    token = await db.get_latest_magic_token_for_email(email)
+    # Get latest unexpired, unused token from database (one query)
+    now = time.time_ns() // 1_000_000_000
+    token = await db.get_latest_valid_magic_token_for_email(email, now)
     if token:
-        # Verify token is not expired by checking expires_at
-        now = int(time.time())
-        token_valid = await db.check_magic_token_valid(token, now)
-        if token_valid:
-            # Log only token prefix (no secrets)
-            token_prefix = token[:6] if len(token) >= 6 else "short"
-            logger.info("GET /debug/last-magic-link: email=%s token_prefix=%s", email, token_prefix)
-            
-            # Build magic link URL
-            base_url = get_public_base_url(request)
-            magic_link = f"{base_url}/auth/verify?token={token}"
-            return JSONResponse({
-                "ok": True,
-                "magic_link": magic_link
-            })
-    
-    return JSONResponse(
-        status_code=404,
-        content={"ok": False, "detail": "not found"}
-    )
-
-
-@app.get("/debug/send-test-email")
-async def debug_send_test_email(request: Request, to: str) -> JSONResponse:
-    """Test email endpoint - sends a simple test email (dev mode only, no secrets in logs).
-    
-    In production, returns 404.
-    """
-    if IS_PRODUCTION:
-        raise HTTPException(status_code=404, detail="Not found")
-    
-    # Get SMTP config
-    smtp_config = get_smtp_config()
-    if not smtp_config["configured"]:
-        return JSONResponse(
-            status_code=503,
-            content={"ok": False, "detail": f"SMTP not configured. Missing: {', '.join(smtp_config['missing_keys'])}"}
-        )
-    
-    # Send test email
-    email_sent, error_msg = await send_email_via_smtp(
-        to_email=to,
-        subject="FormFillAI Test Email",
-        body="<html><body><p>This is a test email from FormFillAI.</p><p>If you received this, SMTP is working correctly.</p></body></html>"
-    )
-    
-    if email_sent:
-        logger.info("Test email sent to %s", to)
-        return JSONResponse({
+        # Log only token prefix (no secrets)
+        token_prefix = token[:6] if len(token) >= 6 else "short"
+        logger.info("GET /debug/last-magic-link: email=%s token_prefix=%s", email, token_prefix)
+        
+        # Build magic link URL
+        base_url = get_public_base_url(request)
+        magic_link = f"{base_url}/auth/verify?token={token}"
+        return make_json_response({
             "ok": True,
-            "message": f"Test email sent to {to}"
+            "magic_link": magic_link
         })
-    else:
-        logger.error("Test email failed to %s: %s", to, error_msg)
-        safe_error = error_msg[:200] if error_msg else "Failed to send test email"
-        return JSONResponse(
-            status_code=503,
-            content={"ok": False, "detail": safe_error}
-        )
+    
+    return make_json_response({"ok": False, "detail": "not found"}, status_code=404)
 
 
-@app.get("/debug/send-test-email")
-async def debug_send_test_email(request: Request, to: str) -> JSONResponse:
+@debug_router.get("/debug/send-test-email")
+async def debug_send_test_email(request: Request, to: str) -> Response:
     """Test email endpoint - sends a simple test email (dev mode only, no secrets in logs).
     
-    In production, returns 404.
+    Not registered in production (404).
     """
-    if IS_PRODUCTION:
-        raise HTTPException(status_code=404, detail="Not found")
-    
     # Get SMTP config
     smtp_config = get_smtp_config()
     if not smtp_config["configured"]:
-        return JSONResponse(
-            status_code=503,
-            content={"ok": False, "detail": f"SMTP not configured. Missing: {', '.join(smtp_config['missing_keys'])}"}
-        )
+        return make_json_response({"ok": False, "detail": f"SMTP not configured. Missing: {', '.join(smtp_config['missing_keys'])}"}, status_code=503)
     
     # Send test email
-    email_sent, error_msg = await send_email_via_smtp(
+    email_sent, error_msg, _ = await send_email_via_smtp(
         to_email=to,
-        subject="FormFillAI Test Email",
-        body="<html><body><p>This is a test email from FormFillAI.</p><p>If you received this, SMTP is working correctly.</p></body></html>"
+        subject=TEST_EMAIL_SUBJECT,
+        body=TEST_EMAIL_HTML
     )
     
     if email_sent:
         logger.info("Test email sent to %s", to)
-        return JSONResponse({
+        return make_json_response({
             "ok": True,
             "message": f"Test email sent to {to}"
         })
     else:
         logger.error("Test email failed to %s: %s", to, error_msg)
         safe_error = error_msg[:200] if error_msg else "Failed to send test email"
-        return JSONResponse(
-            status_code=503,
-            content={"ok": False, "detail": safe_error}
-        )
+        return make_json_response({"ok": False, "detail": safe_error}, status_code=503)
 
 
 @app.get("/debug/cookies")
-async def debug_cookies(request: Request) -> JSONResponse:
+async def debug_cookies(request: Request) -> Response:
     """Debug endpoint to show cookie presence (production-safe, no secrets).
     
     Returns JSON showing:
@@ -3048,7 +3730,7 @@ async def debug_cookies(request: Request) -> JSONResponse:
     - for "session" cookie: only first 8 chars prefix (or null)
     """
     host = request.headers.get("host", "unknown")
-    scheme = request.url.scheme
+    scheme = request.scope["scheme"]
     x_forwarded_proto = request.headers.get("X-Forwarded-Proto", "not set")
     
     # Get all cookie names
@@ -3059,7 +3741,7 @@ async def debug_cookies(request: Request) -> JSONResponse:
     session_cookie = request.cookies.get("session")
     session_prefix = session_cookie[:8] if session_cookie and len(session_cookie) >= 8 else None
     
-    return JSONResponse({
+    return make_json_response({
         "host": host,
         "scheme": scheme,
         "x_forwarded_proto": x_forwarded_proto,
@@ -3069,7 +3751,7 @@ async def debug_cookies(request: Request) -> JSONResponse:
 
 
 @app.get("/debug/session")
-async def debug_session(request: Request) -> JSONResponse:
+async def debug_session(request: Request) -> Response:
     """Debug endpoint to check session cookie and DB lookup (production-safe).
     
     Returns:
@@ -3092,9 +3774,9 @@ async def debug_session(request: Request) -> JSONResponse:
             logger.warning("GET /debug/session: error looking up session: %s", e)
     
     # Get database backend info
-    db_backend = db.get_db_backend_name() or "unknown"
+    db_backend = DB_BACKEND_NAME
     
-    return JSONResponse({
+    return make_json_response({
         "session_present": session_present,
         "session_prefix": session_prefix,  # Only first 8 chars, safe
         "session_found": session_found,
@@ -3102,8 +3784,16 @@ async def debug_session(request: Request) -> JSONResponse:
     })
 
 
+# Fixed for the life of the process
+_DEBUG_AUTH_ENVIRONMENT = {
+    "ENV": ENV or "not set",
+    "DEBUG": DEBUG,
+    "IS_PRODUCTION": IS_PRODUCTION
+}
+
+
 @app.get("/debug/auth")
-async def debug_auth(request: Request) -> JSONResponse:
+async def debug_auth(request: Request) -> Response:
     """Debug endpoint for authentication issues (production-safe).
     
     Returns request info, cookie status, and database backend info.
@@ -3111,7 +3801,7 @@ async def debug_auth(request: Request) -> JSONResponse:
     """
     # Get request info
     host = request.headers.get("host", "unknown")
-    scheme = request.url.scheme
+    scheme = request.scope["scheme"]
     x_forwarded_proto = request.headers.get("X-Forwarded-Proto", "not set")
     
     # Check session cookie
@@ -3129,19 +3819,10 @@ async def debug_auth(request: Request) -> JSONResponse:
             logger.warning("GET /debug/auth: error looking up session: %s", e)
     
     # Get database backend info
-    db_backend = db.get_db_backend_name() or "unknown"
-    database_url_set = bool(os.getenv("DATABASE_URL"))
+    db_backend = DB_BACKEND_NAME
+    database_url_set = DATABASE_URL_SET
     
-    # Try to look up session if present
-    session_found = False
-    if session_cookie:
-        try:
-            session = await db.get_session(session_cookie)
-            session_found = session is not None
-        except Exception as e:
-            logger.warning("debug_auth: error looking up session: %s", e)
-    
-    return JSONResponse({
+    return make_json_response({
         "request": {
             "host": host,
             "scheme": scheme,
@@ -3156,11 +3837,7 @@ async def debug_auth(request: Request) -> JSONResponse:
             "database_url_set": database_url_set,
             "session_found": session_found
         },
-        "environment": {
-            "ENV": ENV or "not set",
-            "DEBUG": DEBUG,
-            "IS_PRODUCTION": IS_PRODUCTION
-        }
+        "environment": _DEBUG_AUTH_ENVIRONMENT
     })
 
 
@@ -3172,7 +3849,7 @@ async def debug_set_test_cookie(request: Request) -> RedirectResponse:
     This lets us verify cookies are working in the browser.
     """
     # Detect HTTPS via X-Forwarded-Proto (Railway/proxy)
-    scheme = request.url.scheme
+    scheme = request.scope["scheme"]
     x_forwarded_proto = request.headers.get("X-Forwarded-Proto", "").lower()
     is_https = (x_forwarded_proto == "https") or (scheme == "https")
     
@@ -3348,12 +4025,12 @@ async def set_user_plan_by_email_endpoint(request: Request) -> JSONResponse:
     })
 
 
-@app.get("/debug/auth-status")
-async def debug_auth_status(request: Request) -> JSONResponse:
+@debug_router.get("/debug/auth-status")
+async def debug_auth_status(request: Request) -> Response:
     """Simplified debug endpoint for authentication status (dev mode only).
     
     Enabled only when ENV!=production OR DEBUG=1.
-    In production, returns 404.
+    Not registered in production (404).
     
     Returns:
         {
@@ -3363,15 +4040,12 @@ async def debug_auth_status(request: Request) -> JSONResponse:
             "backend": str
         }
     """
-    if IS_PRODUCTION:
-        raise HTTPException(status_code=404, detail="Not found")
-    
     # Check session cookie
     session_cookie = request.cookies.get("session")
     cookie_present = bool(session_cookie)
     
     # Get database backend
-    db_backend = db.get_db_backend_name() or "unknown"
+    db_backend = DB_BACKEND_NAME
     
     # Try to look up session if present
     db_session_found = False
@@ -3384,7 +4058,7 @@ async def debug_auth_status(request: Request) -> JSONResponse:
         except Exception as e:
             logger.warning("debug_auth_status: error looking up session: %s", e)
     
-    return JSONResponse({
+    return make_json_response({
         "authenticated": authenticated,
         "cookie_present": cookie_present,
         "db_session_found": db_session_found,
@@ -3392,6 +4066,11 @@ async def debug_auth_status(request: Request) -> JSONResponse:
     })
 
 
+# Register dev-only debug routes last, after all of them are declared
+if not IS_PRODUCTION:
+    app.include_router(debug_router)
+
+
 if __name__ == "__main__":
     # Read PORT from environment (Railway provides this as an environment variable)
     # Default to 8000 for local development
@@ -3401,10 +4080,18 @@ if __name__ == "__main__":
     
     # Start uvicorn programmatically
     # This ensures PORT is read as an integer, not a string
-    uvicorn.run(
+    # loop/http "auto" pick uvloop and httptools (shipped with uvicorn[standard]) and
+    # fall back to asyncio/h11 where they are unavailable; handlers already log the
+    # events that matter, so uvicorn's per-request access log is off
+    config = uvicorn.Config(
         app,
         host="0.0.0.0",
         port=port,
-        proxy_headers=True
+        proxy_headers=True,
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        access_log=False,
     )
+    uvicorn.Server(config).run()
 
@@ -0,0 +1,39 @@
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from reportlab.pdfgen import canvas
+
+os.environ.setdefault("DEBUG", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+
+def make_form_pdf(field_names=("a", "b")) -> bytes:
+    """One-page AcroForm PDF with a text field per name."""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer)
+    for i, name in enumerate(field_names):
+        c.acroForm.textfield(name=name, x=50, y=700 - 40 * i, width=200, height=20)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def tmp_dirs(tmp_path, monkeypatch):
+    """Point the app's tmp/preview/upload directories at a per-test directory."""
+    monkeypatch.setattr(main, "TMP_DIR", tmp_path)
+    monkeypatch.setattr(main, "PREVIEW_DIR", tmp_path / "previews")
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(main, "_tmp_dirs_ready", False)
+    main.ensure_tmp_dir()
+    return tmp_path
+
+
+@pytest.fixture
+def form_pdf() -> bytes:
+    return make_form_pdf()
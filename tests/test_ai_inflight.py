@@ -0,0 +1,77 @@
+import asyncio
+import gc
+
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def empty_ai_state(monkeypatch):
+    monkeypatch.setattr(main, "_ai_response_cache", main.OrderedDict())
+    monkeypatch.setattr(main, "_inflight_ai_requests", {})
+
+
+def test_concurrent_identical_calls_share_one_request():
+    calls = 0
+
+    async def make_request():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return '{"a": "1"}'
+
+    async def run():
+        return await asyncio.gather(*(main.fetch_ai_response(b"key", make_request) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert results == ['{"a": "1"}'] * 5
+    assert main._inflight_ai_requests == {}
+
+
+def test_failure_reaches_every_waiter_and_is_not_reused():
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model down")
+
+    async def run():
+        results = await asyncio.gather(
+            *(main.fetch_ai_response(b"key", failing) for _ in range(3)),
+            return_exceptions=True,
+        )
+        # The next call starts a fresh request instead of replaying the failure
+        retry = await main.fetch_ai_response(b"key", lambda: asyncio.sleep(0, result="ok"))
+        return results, retry
+
+    results, retry = asyncio.run(run())
+
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert retry == "ok"
+
+
+def test_failure_with_all_waiters_cancelled_is_retrieved():
+    unretrieved = []
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model down")
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unretrieved.append(ctx))
+        waiter = asyncio.create_task(main.fetch_ai_response(b"key", failing))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+        gc.collect()
+
+    asyncio.run(run())
+
+    assert unretrieved == []
+    assert main._inflight_ai_requests == {}
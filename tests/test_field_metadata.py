@@ -0,0 +1,62 @@
+from io import BytesIO
+
+from fastapi.testclient import TestClient
+from pypdf import PdfReader
+from pypdf.generic import NameObject, TextStringObject
+
+import main
+from conftest import make_form_pdf
+
+
+class BrokenLabelField(dict):
+    """Field dict whose tooltip lookup fails, as a malformed /TU can."""
+
+    def get(self, key, default=None):
+        if key == "/TU":
+            raise ValueError("bad tooltip")
+        return super().get(key, default)
+
+
+class FakeReader:
+    def __init__(self, fields):
+        self._fields = fields
+
+    def get_fields(self):
+        return self._fields
+
+
+def test_label_error_keeps_value_and_type():
+    field = BrokenLabelField({
+        NameObject("/FT"): main.FIELD_TYPE_CHOICE,
+        NameObject("/V"): TextStringObject("green"),
+        NameObject("/Opt"): [TextStringObject("red"), TextStringObject("green")],
+    })
+
+    [info] = main.extract_field_metadata(FakeReader({"color": field}))
+
+    assert info == {
+        "name": "color",
+        "label": "color",
+        "value": "green",
+        "type": "choice",
+        "options": ["red", "green"],
+    }
+
+
+def test_extracts_text_fields_from_pdf():
+    reader = PdfReader(BytesIO(make_form_pdf(("first", "second"))))
+
+    metadata = main.extract_field_metadata(reader)
+
+    assert [(f["name"], f["type"], f["value"]) for f in metadata] == [("first", "text", ""), ("second", "text", "")]
+
+
+def test_fields_accepts_hex_escaped_acroform_name(tmp_dirs):
+    # "/Acro#46orm" is a valid spelling of /AcroForm that a byte scan misses
+    pdf = make_form_pdf(("first",)).replace(b"/AcroForm", b"/Acro#46orm")
+    assert b"/AcroForm" not in pdf and b"/ObjStm" not in pdf
+
+    response = TestClient(main.app).post("/fields", files={"pdf_file": ("form.pdf", pdf, "application/pdf")})
+
+    assert response.status_code == 200
+    assert [f["name"] for f in response.json()["fields"]] == ["first"]
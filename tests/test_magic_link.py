@@ -0,0 +1,76 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+
+import main
+
+
+def json_request(payload: dict) -> Request:
+    body = orjson.dumps(payload)
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/auth/send-magic-link",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "headers": [(b"content-type", b"application/json"), (b"host", b"testserver")],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+@pytest.fixture
+def issued(monkeypatch):
+    """Replace token creation + delivery with a recorder returning queued responses."""
+    calls = []
+    responses = []
+
+    async def fake_issue(email, base_url):
+        calls.append((email, base_url))
+        await asyncio.sleep(0.01)
+        return responses.pop(0) if responses else ORJSONResponse({"ok": True})
+
+    monkeypatch.setattr(main, "_issue_magic_link", fake_issue)
+    monkeypatch.setattr(main.db, "is_db_available", lambda: True)
+    monkeypatch.setattr(main, "_inflight_magic_links", {})
+    return calls, responses
+
+
+def test_concurrent_sends_share_one_issue(issued):
+    calls, _ = issued
+
+    async def run():
+        return await asyncio.gather(
+            main.send_magic_link(json_request({"email": "a@example.com"})),
+            main.send_magic_link(json_request({"email": "A@example.com"})),
+        )
+
+    first, second = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert first is not second
+    assert first.status_code == second.status_code == 200
+    assert first.body == second.body
+    assert main._inflight_magic_links == {}
+
+
+def test_retry_after_failure_is_not_served_stale_result(issued):
+    calls, responses = issued
+    responses.append(ORJSONResponse(status_code=503, content={"ok": False, "detail": "down"}))
+
+    async def run():
+        failed = await main.send_magic_link(json_request({"email": "a@example.com"}))
+        retried = await main.send_magic_link(json_request({"email": "a@example.com"}))
+        return failed, retried
+
+    failed, retried = asyncio.run(run())
+
+    assert failed.status_code == 503
+    assert retried.status_code == 200
+    assert len(calls) == 2
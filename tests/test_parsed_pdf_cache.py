@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from pypdf import PdfReader
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(main, "_parsed_pdf_cache", main.OrderedDict())
+    monkeypatch.setattr(main, "PARSED_PDF_CACHE_SIZE", 2)
+
+
+def test_lru_eviction_keeps_recently_used(form_pdf):
+    readers = {name: PdfReader(BytesIO(form_pdf)) for name in ("a", "b", "c")}
+    main.cache_parsed_pdf("a", readers["a"])
+    main.cache_parsed_pdf("b", readers["b"])
+    assert main.get_cached_parsed_pdf("a")[0] is readers["a"]  # a is now most recent
+
+    main.cache_parsed_pdf("c", readers["c"])
+
+    assert main.get_cached_parsed_pdf("b") is None
+    assert main.get_cached_parsed_pdf("a")[0] is readers["a"]
+    assert main.get_cached_parsed_pdf("c")[0] is readers["c"]
+
+
+def test_each_entry_gets_its_own_lock(form_pdf):
+    first = main.cache_parsed_pdf("a", PdfReader(BytesIO(form_pdf)))
+    second = main.cache_parsed_pdf("b", PdfReader(BytesIO(form_pdf)))
+    assert first[1] is not second[1]
+    assert main.get_cached_parsed_pdf("a") is first
+
+
+def test_forget_parsed_pdf_only_drops_originals(form_pdf):
+    main.cache_parsed_pdf("abc", PdfReader(BytesIO(form_pdf)))
+    main.forget_parsed_pdf("abc_meta.json")
+    assert main.get_cached_parsed_pdf("abc") is not None
+    main.forget_parsed_pdf("abc_original.pdf")
+    assert main.get_cached_parsed_pdf("abc") is None
+
+
+def test_run_locked_serializes_fills_on_one_entry(tmp_dirs, form_pdf):
+    reader, lock = main.cache_parsed_pdf("abc", PdfReader(BytesIO(form_pdf)))
+    active = 0
+    peak = 0
+    guard = threading.Lock()
+
+    def fill(i):
+        nonlocal active, peak
+        with guard:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.01)
+        path = main.fill_pdf_form(None, {"a": f"v{i}"}, False, output_path=tmp_dirs / f"{i}.pdf", reader=reader)
+        with guard:
+            active -= 1
+        return path
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        paths = list(pool.map(lambda i: main.run_locked(lock, fill, i), range(4)))
+
+    assert peak == 1
+    for i, path in enumerate(paths):
+        assert PdfReader(str(path)).get_fields()["a"].get("/V") == f"v{i}"
@@ -0,0 +1,33 @@
+from io import BytesIO
+
+from pypdf import PdfReader
+
+import main
+
+
+def field_values(path) -> dict:
+    fields = PdfReader(str(path)).get_fields()
+    return {name: field.get("/V") for name, field in fields.items()}
+
+
+def test_fills_from_one_reader_do_not_bleed(tmp_dirs, form_pdf):
+    reader = PdfReader(BytesIO(form_pdf))
+
+    first = main.fill_pdf_form(None, {"a": "A1"}, False, output_path=tmp_dirs / "first.pdf", reader=reader)
+    second = main.fill_pdf_form(None, {"b": "B2"}, False, output_path=tmp_dirs / "second.pdf", reader=reader)
+
+    assert field_values(first) == {"a": "A1", "b": ""}
+    assert field_values(second) == {"a": "", "b": "B2"}
+    # The parsed original itself is left untouched
+    assert {name: field.get("/V") for name, field in reader.get_fields().items()} == {"a": "", "b": ""}
+    assert "/NeedAppearances" not in reader.trailer["/Root"]["/AcroForm"]
+
+
+def test_watermarked_fill_keeps_reader_reusable(tmp_dirs, form_pdf):
+    reader = PdfReader(BytesIO(form_pdf))
+
+    main.fill_pdf_form(None, {"a": "free"}, True, output_path=tmp_dirs / "free.pdf", reader=reader)
+    pro = main.fill_pdf_form(None, {"a": "pro"}, False, output_path=tmp_dirs / "pro.pdf", reader=reader)
+
+    assert field_values(pro) == {"a": "pro", "b": ""}
+    assert "FormFillAI" not in PdfReader(str(pro)).pages[0].extract_text()
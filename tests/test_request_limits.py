@@ -0,0 +1,87 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    # No context manager: startup (DB init, cleanup loops) is not needed here
+    return TestClient(main.app)
+
+
+def chunked(data: bytes, size: int = 64 * 1024):
+    """Body as a generator, so it is sent chunked without Content-Length."""
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_upload_over_limit_without_content_length_is_413(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_REQUEST_SIZE", 1024)
+    boundary = "x" * 16
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"pdf_file\"; filename=\"f.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + b"0" * 4096 + f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/fields",
+        content=chunked(body, 512),
+        headers={"content-type": f"multipart/form-data; boundary={boundary}"},
+    )
+
+    assert response.status_code == 413
+    assert response.json() == {"detail": f"File too large. Maximum size is {main.MAX_UPLOAD_SIZE // (1024 * 1024)}MB."}
+
+
+def test_read_upload_file_over_limit_is_413():
+    upload = UploadFile(BytesIO(b" " * (1024 * 1024 + 1)), filename="data.json")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(main.read_upload_file(upload, max_size=1024 * 1024))
+
+    assert exc_info.value.status_code == 413
+    assert exc_info.value.detail == "File too large. Maximum size is 1MB."
+
+
+def test_json_body_over_limit_is_413(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_FORM_REQUEST_SIZE", 1024)
+    body = b'{"token": "' + b"x" * 2048 + b'"}'
+
+    declared = client.post("/auth/verify", content=body, headers={"content-type": "application/json"})
+    streamed = client.post("/auth/verify", content=chunked(body, 256), headers={"content-type": "application/json"})
+
+    assert declared.status_code == 413
+    assert streamed.status_code == 413
+    assert declared.json() == streamed.json() == {"detail": "Request body too large."}
+
+
+def test_json_body_under_limit_reaches_handler(client):
+    response = client.post("/auth/verify", json={"token": ""})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Token is required"}
+
+
+@pytest.mark.parametrize("path", ["/auth/verify", "/auth/send-magic-link"])
+@pytest.mark.parametrize("encoding", ["multipart", "urlencoded"])
+def test_auth_form_with_too_many_fields_is_400(client, monkeypatch, path, encoding):
+    monkeypatch.setattr(main.db, "is_db_available", lambda: True)
+    fields = {f"extra{i}": "x" for i in range(main.AUTH_FORM_MAX_FIELDS)}
+    fields["token" if path == "/auth/verify" else "email"] = "a@example.com"
+    if encoding == "multipart":
+        response = client.post(path, files={name: (None, value) for name, value in fields.items()})
+    else:
+        response = client.post(path, data=fields)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": f"Too many fields. Maximum number of fields is {main.AUTH_FORM_MAX_FIELDS}."}
+
+
+def test_auth_form_rejects_file_parts(client):
+    response = client.post("/auth/verify", files={"token": ("token.txt", b"abc")})
+
+    assert response.status_code == 400
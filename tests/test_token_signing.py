@@ -0,0 +1,20 @@
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("blake2b_tags, tag_length", [(False, 64), (True, 32)])
+def test_new_tokens_use_configured_tag(monkeypatch, blake2b_tags, tag_length):
+    monkeypatch.setattr(main, "TOKEN_MAC_BLAKE2B", blake2b_tags)
+
+    token = main._sign_token('{"exp":1}')
+
+    assert len(token.rsplit(".", 1)[1]) == tag_length
+    assert main._verify_token(token) == '{"exp":1}'
+
+
+def test_both_tag_schemes_verify_and_tampering_fails():
+    raw = '{"exp":2}'
+    for sig in (main._token_signature(raw), main._legacy_token_signature(raw)):
+        assert main._verify_token(f"{raw}.{sig}") == raw
+        assert main._verify_token(f'{{"exp":3}}.{sig}') is None
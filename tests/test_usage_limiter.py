@@ -0,0 +1,36 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.fixture
+def day(monkeypatch):
+    current = [main._local_day()]
+    monkeypatch.setattr(main, "_local_day", lambda: current[0])
+    return current
+
+
+def test_local_day_matches_local_date():
+    assert main._local_day() == main.date.today().toordinal()
+
+
+def test_limit_resets_on_next_local_day(day):
+    limiter = main.UsageLimiter()
+    limiter.check_and_increment("tok", limit=1)
+    with pytest.raises(HTTPException) as exc_info:
+        limiter.check_and_increment("tok", limit=1)
+    assert exc_info.value.status_code == 429
+
+    day[0] += 1
+    limiter.check_and_increment("tok", limit=1)
+
+
+def test_sweep_drops_only_previous_days(day):
+    limiter = main.UsageLimiter()
+    limiter.check_and_increment("old")
+    day[0] += 1
+    limiter.check_and_increment("new")
+
+    assert limiter.sweep() == 1
+    assert limiter.sweep() == 0